@@ -20,9 +20,11 @@ import os
 import re
 import time
 import logging
+from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
 try:
     # Optional: semantic retrieval if LangChain + Chroma are available
@@ -84,11 +86,14 @@ def _normalize_name(name: str) -> str:
 
 
 def _flatten_tree(nodes: List[Dict]) -> List[Dict]:
+    # Pre-order walk with an explicit stack (no recursion or per-level lists)
     out = []
-    for n in nodes or []:
+    stack = list(reversed(nodes or []))
+    while stack:
+        n = stack.pop()
         out.append(n)
         if n.get("children"):
-            out.extend(_flatten_tree(n["children"]))
+            stack.extend(reversed(n["children"]))
     return out
 
 
@@ -129,6 +134,9 @@ class AgentsManager:
         self.data_service = data_service
         self.store_path = store_path
         self.ollama_url = ollama_url.rstrip('/')
+        # Keep-alive session so repeated LLM calls reuse TCP connections to Ollama
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
         os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
         self._agents: Dict[str, Dict[str, Any]] = {}
         self._load()
@@ -416,7 +424,6 @@ class AgentsManager:
     # Agent run
     # -----------------
     def search_notes(self, query: str, tag_filters: Dict[str, Any], strategy: str, top_k: int, chunk_size: int, recency_boost_days: Optional[int]) -> List[Dict[str, Any]]:
-        from datetime import datetime
         notes = [n for n in self._get_all_notes() if self._note_matches_filters(n, tag_filters)]
         strat = (strategy or 'hybrid').lower()
 
@@ -443,12 +450,12 @@ class AgentsManager:
         def parse_when(ts: Optional[str]) -> Optional[datetime]:
             if not ts:
                 return None
-            for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
-                try:
-                    return datetime.strptime(ts.split('.')[0], fmt)
-                except Exception:
-                    continue
-            return None
+            # Accepts "YYYY-MM-DD HH:MM:SS", the "T" form and bare dates in one
+            # parse instead of trying each strptime format in turn
+            try:
+                return datetime.fromisoformat(ts.split('.')[0])
+            except (TypeError, ValueError):
+                return None
 
         now = datetime.utcnow()
         def recency_factor(when: Optional[str]) -> float:
@@ -473,6 +480,8 @@ class AgentsManager:
             text = (note.get('text') or '').strip()
             if not text:
                 continue
+            # Parse the note's timestamp once, not once per chunk
+            recency = recency_factor(note.get('updated_at'))
             # Build sentence-aware windows up to chunk_size
             idx = 0
             sentences = []
@@ -503,7 +512,7 @@ class AgentsManager:
                     if snippet:
                         sn_l = snippet.lower()
                         tf = sum(sn_l.count(t) for t in q_terms)
-                        score = (base_score + tf * 1.0) * recency_factor(note.get('updated_at'))
+                        score = (base_score + tf * 1.0) * recency
                         chunks_scored.append((score, {
                             'note_id': note['id'],
                             'title': note['name'],
@@ -523,7 +532,7 @@ class AgentsManager:
                 if snippet:
                     sn_l = snippet.lower()
                     tf = sum(sn_l.count(t) for t in q_terms)
-                    score = (base_score + tf * 1.0) * recency_factor(note.get('updated_at'))
+                    score = (base_score + tf * 1.0) * recency
                     chunks_scored.append((score, {
                         'note_id': note['id'],
                         'title': note['name'],
@@ -945,7 +954,7 @@ class AgentsManager:
 
     def _call_ollama(self, model: str, prompt: str, temperature: float, max_tokens: int) -> str:
         try:
-            resp = requests.post(
+            resp = self._session.post(
                 f"{self.ollama_url}/api/generate",
                 json={
                     "model": model,
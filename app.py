@@ -3,10 +3,12 @@ import json
 import os
 import re
 import requests  # For proxying to Ollama
+from requests.adapters import HTTPAdapter
 import tempfile  # For temporary audio files
 import whisper   # You'll need to install this: pip install openai-whisper
 import io
 import logging
+from datetime import datetime
 from flask import send_file
 from data_service import DataService
 from chat_history_manager import ChatHistoryManager
@@ -27,6 +29,15 @@ except ImportError as e:
     AUDIO_PROCESSING_AVAILABLE = False
     print(f"Audio processing libraries not available: {e}")
 
+# Import WebRTC VAD for dropping silence before transcription
+try:
+    import webrtcvad
+    VAD_AVAILABLE = True
+    print("WebRTC VAD loaded successfully")
+except ImportError:
+    VAD_AVAILABLE = False
+    print("WebRTC VAD not available. Install with: pip install webrtcvad")
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,6 +53,11 @@ except ImportError:
     KOKORO_AVAILABLE = False
     print("Kokoro TTS library not available. Install with: pip install kokoro>=0.8.4 soundfile")
 
+# Shared keep-alive session for Ollama HTTP calls, so each request reuses a
+# pooled TCP connection instead of opening a new one
+ollama_session = requests.Session()
+ollama_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 app = Flask(__name__, 
             static_folder='static',
             template_folder='templates')
@@ -117,6 +133,10 @@ except Exception as e:
     if whisper_model is None:
         print("Failed to load any Whisper model")
 
+# Run Whisper in half precision only where it is supported (CUDA); on CPU this
+# skips the per-call FP16 attempt, warning and FP32 fallback
+WHISPER_FP16 = whisper_model is not None and whisper_model.device.type == 'cuda'
+
 # Initialize Kokoro TTS pipelines with different language models
 tts_pipelines = {}
 if KOKORO_AVAILABLE:
@@ -138,6 +158,39 @@ AVAILABLE_VOICES = {
     'en-GB-Neural2-M': {'lang': 'en-GB', 'voice': 'bm_full', 'description': 'UK Male - Full'}
 }
 
+VAD_SAMPLE_RATE = 16000
+VAD_FRAME_SAMPLES = 480  # 30 ms frames at 16kHz
+VAD_PADDING_FRAMES = 10  # ~300 ms kept on each side of speech so onsets aren't clipped
+
+def keep_voiced_audio(audio_array):
+    """
+    Drop non-speech frames from 16kHz float32 audio using WebRTC VAD.
+    Returns the voiced audio (padded around speech), an empty array if no
+    speech was found, or the input unchanged if VAD is not available.
+    """
+    if not VAD_AVAILABLE:
+        return audio_array
+    
+    n_frames = len(audio_array) // VAD_FRAME_SAMPLES
+    if n_frames == 0:
+        return audio_array
+    
+    audio_array = audio_array[:n_frames * VAD_FRAME_SAMPLES]
+    pcm = (np.clip(audio_array, -1.0, 1.0) * 32767).astype('<i2').reshape(n_frames, VAD_FRAME_SAMPLES)
+    vad = webrtcvad.Vad(2)
+    voiced = np.fromiter(
+        (vad.is_speech(frame.tobytes(), VAD_SAMPLE_RATE) for frame in pcm),
+        dtype=bool,
+        count=n_frames
+    )
+    if not voiced.any():
+        return audio_array[:0]
+    
+    # Widen each voiced run by the padding so word edges and short pauses survive
+    keep = np.convolve(voiced, np.ones(2 * VAD_PADDING_FRAMES + 1), mode='same') > 0
+    logger.info(f"VAD kept {int(keep.sum())}/{n_frames} frames")
+    return audio_array[np.repeat(keep, VAD_FRAME_SAMPLES)]
+
 def preprocess_audio_for_whisper(audio_path):
     """
     Preprocess audio file to improve Whisper transcription quality.
@@ -173,16 +226,14 @@ def preprocess_audio_for_whisper(audio_path):
             audio = audio.set_frame_rate(16000)
             logger.info("Resampled to 16kHz")
         
-        # Apply noise reduction using librosa for better accuracy
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_wav:
-            temp_wav_path = temp_wav.name
-        
-        # Export to WAV first
-        audio.export(temp_wav_path, format='wav')
-        
         # Use librosa for noise reduction and enhancement
         try:
-            y, sr = librosa.load(temp_wav_path, sr=16000)
+            # Take the samples straight from pydub as float32 in [-1, 1]
+            # (what librosa.load would return) instead of exporting a
+            # temporary WAV file and decoding it again
+            sr = audio.frame_rate
+            y = np.array(audio.get_array_of_samples(), dtype=np.float32)
+            y /= float(1 << (8 * audio.sample_width - 1))
             
             if len(y) > 0:
                 # Trim silence more aggressively
@@ -199,12 +250,14 @@ def preprocess_audio_for_whisper(audio_path):
                     
                     # Simple noise gate - suppress very quiet parts
                     noise_threshold = np.percentile(magnitude, 20)  # Bottom 20% considered noise
-                    magnitude_gated = np.where(magnitude > noise_threshold, magnitude, magnitude * 0.1)
+                    
+                    # Scale the complex STFT in place rather than splitting it into
+                    # magnitude and phase and rebuilding it with np.exp; same
+                    # result without the angle/exp passes and temporaries
+                    stft[magnitude <= noise_threshold] *= 0.1
                     
                     # Reconstruct audio
-                    phase = np.angle(stft)
-                    stft_cleaned = magnitude_gated * np.exp(1j * phase)
-                    y_cleaned = librosa.istft(stft_cleaned)
+                    y_cleaned = librosa.istft(stft)
                     
                     # Final normalization
                     y_final = librosa.util.normalize(y_cleaned)
@@ -215,25 +268,18 @@ def preprocess_audio_for_whisper(audio_path):
                     
                     sf.write(processed_path, y_final, sr)
                     
-                    # Clean up temporary file
-                    os.unlink(temp_wav_path)
-                    
                     logger.info(f"Audio preprocessed with noise reduction - Duration: {len(y_final)/sr:.2f}s")
                     return processed_path
                 else:
                     logger.warning("Audio became too short after trimming silence")
-                    os.unlink(temp_wav_path)
                     return None
             else:
                 logger.warning("Audio data is empty")
-                os.unlink(temp_wav_path)
                 return None
                 
         except Exception as librosa_error:
             logger.warning(f"Librosa processing failed: {librosa_error}, using basic processing")
             # Fallback to basic processing
-            os.unlink(temp_wav_path)
-            
             # Create output file with basic processing only
             with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as processed_file:
                 processed_path = processed_file.name
@@ -260,8 +306,8 @@ def mobile_test():
 @app.route('/api/tree', methods=['GET', 'POST'])
 def manage_tree():
     if request.method == 'GET':
-        tree_data = data_service.get_tree()
-        return jsonify(tree_data)
+        # Served pre-serialized from the cache instead of re-encoding per request
+        return Response(data_service.get_tree_json(), mimetype='application/json')
     elif request.method == 'POST':
         tree_data = request.json
         # For now, we'll handle individual node updates
@@ -477,7 +523,6 @@ def create_custom_template():
         }
         
         # Add timestamp
-        from datetime import datetime
         template_data["createdAt"] = datetime.now().isoformat()
         
         # Save template file
@@ -639,7 +684,6 @@ def update_custom_template(template_id):
             template_file = new_template_file
         
         # Update template data
-        from datetime import datetime
         template_data = {
             "name": template_name,
             "description": template_description,
@@ -762,16 +806,15 @@ def manage_chats():
     if request.method == 'GET':
         # Get all chat nodes from the tree
         tree = data_service.get_tree()
+        # Walk the tree in pre-order with an explicit stack
         chat_nodes = []
-        
-        def extract_chats(nodes):
-            for node in nodes:
-                if node['type'] == 'chat':
-                    chat_nodes.append(node)
-                if 'children' in node:
-                    extract_chats(node['children'])
-        
-        extract_chats(tree)
+        stack = list(reversed(tree))
+        while stack:
+            node = stack.pop()
+            if node['type'] == 'chat':
+                chat_nodes.append(node)
+            if 'children' in node:
+                stack.extend(reversed(node['children']))
         return jsonify(chat_nodes)
     
     elif request.method == 'POST':
@@ -824,9 +867,10 @@ def chat():
     # Load existing chat history if available
     if chat_id != 'default':
         try:
-            existing_chat = data_service.get_chat(chat_id)
-            if existing_chat and 'messages' in existing_chat:
-                chat_history_manager.load_chat_history(chat_id, existing_chat['messages'])
+            # Memory only keeps the newest max_messages, so fetch just that tail
+            messages = data_service.get_chat_messages(chat_id, limit=chat_history_manager.max_messages)
+            if messages:
+                chat_history_manager.load_chat_history(chat_id, messages)
         except Exception as e:
             logger.warning(f"Could not load chat history for {chat_id}: {e}")
     
@@ -960,7 +1004,7 @@ Rules:
 Title:"""
     
     try:
-        response = requests.post(
+        response = ollama_session.post(
             "http://127.0.0.1:11434/api/generate",
             json={
                 "model": "llama3.2:1b",
@@ -1152,15 +1196,38 @@ def transcribe_audio_file(file_path):
         # Use processed audio if different from original, otherwise use original
         transcription_path = processed_audio_path if processed_audio_path != file_path else file_path
         
+        # Decode the audio to a 16kHz float32 array once and reuse it for
+        # language detection and transcription, instead of letting each Whisper
+        # call re-read and re-decode the file. Preprocessed audio is already a
+        # 16kHz mono WAV, so it is read in-process with soundfile rather than
+        # spawning another ffmpeg subprocess via whisper.load_audio.
+        if transcription_path != file_path:
+            audio_array, _ = sf.read(transcription_path, dtype='float32')
+        else:
+            audio_array = whisper.load_audio(transcription_path)
+        
+        # Clean up processed file if different from original; the decoded
+        # array is all that's needed from here on
+        if processed_audio_path and processed_audio_path != file_path:
+            try:
+                os.unlink(processed_audio_path)
+            except:
+                pass
+        
+        # Drop silent frames so Whisper only processes speech, and skip it
+        # entirely when there is none
+        audio_array = keep_voiced_audio(audio_array)
+        if audio_array.size == 0:
+            logger.warning("VAD found no speech in audio")
+            return {"success": False, "error": "No speech detected in audio. Please try speaking more clearly and ensure good microphone placement."}
+        
         # Auto-detect language using Whisper's detect_language
         whisper_language = None
         detected_language = 'unknown'
         detected_prob = 0.0
         
         try:
-            audio_array = whisper.load_audio(transcription_path)
-            audio_array = whisper.pad_or_trim(audio_array)
-            mel = whisper.log_mel_spectrogram(audio_array).to(whisper_model.device)
+            mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio_array)).to(whisper_model.device)
             _, lang_probs = whisper_model.detect_language(mel)
             # Select top language
             detected_language, detected_prob = max(lang_probs.items(), key=lambda x: x[1])
@@ -1176,9 +1243,10 @@ def transcribe_audio_file(file_path):
 
         try:
             result = whisper_model.transcribe(
-                transcription_path,
+                audio_array,
                 language=whisper_language,
                 task='transcribe',
+                fp16=WHISPER_FP16,
                 verbose=False,
                 temperature=[0.0, 0.2],
                 beam_size=5,
@@ -1192,9 +1260,10 @@ def transcribe_audio_file(file_path):
         except Exception as whisper_error:
             logger.warning(f"Transcription failed: {whisper_error}; retrying with auto language")
             result = whisper_model.transcribe(
-                transcription_path,
+                audio_array,
                 language=None,
                 task='transcribe',
+                fp16=WHISPER_FP16,
                 verbose=False,
                 temperature=[0.0, 0.2],
                 beam_size=5,
@@ -1218,13 +1287,6 @@ def transcribe_audio_file(file_path):
         
         logger.info(f"Transcription result - Language: {detected_language}, Text length: {len(transcribed_text)}, Avg confidence: {avg_confidence:.3f}")
         
-        # Clean up processed file if different from original
-        if processed_audio_path and processed_audio_path != file_path:
-            try:
-                os.unlink(processed_audio_path)
-            except:
-                pass
-        
         # Check if we got any meaningful transcription
         if not transcribed_text:
             logger.warning("No transcription returned from Whisper model")
@@ -1283,7 +1345,7 @@ def transcribe_audio_debug():
         logger.info(f"DEBUG: Processing audio file directly - size: {file_size} bytes")
         
         # Use minimal Whisper options
-        result = whisper_model.transcribe(audio_path, verbose=True)
+        result = whisper_model.transcribe(audio_path, verbose=True, fp16=WHISPER_FP16)
         
         logger.info(f"DEBUG: Raw Whisper result: {result}")
         
@@ -1355,7 +1417,7 @@ def tts_generate():
             audio_path = temp_audio.name
         
         # Generate audio using Kokoro
-        full_audio = np.array([])
+        pause = np.zeros(int(24000 * 0.3))  # 0.3s pause at 24kHz between sentences
         
         # Process the text in smaller chunks to avoid too long sentences
         generator = pipeline(
@@ -1365,24 +1427,22 @@ def tts_generate():
             split_pattern=r'[.!?;:]\s+'  # Split on sentence boundaries
         )
         
-        # Process each chunk
-        for _, _, audio_chunk in generator:
-            if len(audio_chunk) > 0:
-                # Append to the full audio array
-                if len(full_audio) == 0:
-                    full_audio = audio_chunk
-                else:
+        # Stream each chunk straight into the WAV file as it is generated, so
+        # memory stays bounded regardless of text length
+        with sf.SoundFile(audio_path, mode='w', samplerate=24000, channels=1) as audio_out:  # Kokoro uses 24kHz sample rate
+            wrote_audio = False
+            for _, _, audio_chunk in generator:
+                if len(audio_chunk) > 0:
                     # Add a small pause between sentences
-                    pause = np.zeros(int(24000 * 0.3))  # 0.3s pause at 24kHz
-                    full_audio = np.concatenate((full_audio, pause, audio_chunk))
-        
-        # Save the audio to the temporary file
-        if len(full_audio) > 0:
-            sf.write(audio_path, full_audio, 24000)  # Kokoro uses 24kHz sample rate
-        else:
-            # If no audio was generated, create a silent file
-            sf.write(audio_path, np.zeros(1000), 24000)
-            print("Warning: No audio content was generated")
+                    if wrote_audio:
+                        audio_out.write(pause)
+                    audio_out.write(np.asarray(audio_chunk))
+                    wrote_audio = True
+            
+            if not wrote_audio:
+                # If no audio was generated, write a short silent clip
+                audio_out.write(np.zeros(1000))
+                print("Warning: No audio content was generated")
         
         # Return the audio file - Fix: remove attachment_filename parameter
         return send_file(
@@ -1403,11 +1463,14 @@ def search_content():
     """Search across all content."""
     query = request.args.get('q', '')
     content_type = request.args.get('type', 'all')
+    # Optional paging; without a limit every hit is returned
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
     
     if not query:
         return jsonify({"results": []})
     
-    results = data_service.search_content(query, content_type)
+    results = data_service.search_content(query, content_type, limit, offset)
     return jsonify({"results": results})
 
 @app.route('/api/recent', methods=['GET'])
@@ -1433,7 +1496,9 @@ def tags_index():
         limit = int(request.args.get('limit', 50))
         include_usage = request.args.get('includeUsage', 'false').lower() == 'true'
         parent_id = request.args.get('parentId')
-        tags = data_service.list_tags(q=q, limit=limit, include_usage=include_usage, parent_id=parent_id)
+        include_aliases = request.args.get('includeAliases', 'true').lower() == 'true'
+        tags = data_service.list_tags(q=q, limit=limit, include_usage=include_usage, parent_id=parent_id,
+                                      include_aliases=include_aliases)
         return jsonify({ 'tags': tags })
     else:
         payload = request.json or {}
@@ -1535,7 +1600,7 @@ def health_check():
 def get_ollama_models():
     """Get list of available Ollama models."""
     try:
-        response = requests.get(
+        response = ollama_session.get(
             "http://127.0.0.1:11434/api/tags",
             timeout=10
         )
@@ -1568,7 +1633,7 @@ def compose_debug():
         ollama_status = "disconnected"
         models = []
         try:
-            response = requests.get("http://127.0.0.1:11434/api/tags", timeout=5)
+            response = ollama_session.get("http://127.0.0.1:11434/api/tags", timeout=5)
             if response.ok:
                 ollama_status = "connected"
                 models = [m.get('name', '') for m in response.json().get('models', [])]
@@ -2368,7 +2433,7 @@ def compose_action():
     
     # Validate that the model exists in Ollama
     try:
-        models_response = requests.get("http://127.0.0.1:11434/api/tags", timeout=10)
+        models_response = ollama_session.get("http://127.0.0.1:11434/api/tags", timeout=10)
         if models_response.ok:
             available_models = [m.get('name', '') for m in models_response.json().get('models', [])]
             if model_name not in available_models:
@@ -2414,7 +2479,7 @@ def compose_action():
         # Call Ollama directly
         try:
             logger.info(f"Calling Ollama with model: {model_name}, action: {action}, max_tokens: {max_toks}")
-            response = requests.post(
+            response = ollama_session.post(
                 "http://127.0.0.1:11434/api/generate",
                 json={
                     "model": model_name,
@@ -2,27 +2,191 @@
 Chat History Manager using LangChain for context-aware conversations
 """
 
-from langchain_ollama import OllamaLLM
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from typing import List, Dict, Any, Generator, Optional
+from typing import List, Dict, Any, Generator, Optional, KeysView, Tuple, Deque, Sequence
 import json
 import logging
-import requests
+import httpx
 import re
 import asyncio
+import concurrent.futures
+import functools
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+try:
+    # Optional: faster JSON encoding/decoding for the Ollama streaming path
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    _ORJSON_AVAILABLE = False
+
+try:
+    # Optional: Aho-Corasick automaton for the web search literal prefilter
+    import ahocorasick
+    _AHOCORASICK_AVAILABLE = True
+except ImportError:
+    _AHOCORASICK_AVAILABLE = False
+
+try:
+    # Optional: RE2 (google-re2) for linear-time matching of the trigger regex
+    import re2
+    _RE2_AVAILABLE = True
+except ImportError:
+    _RE2_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+
+def _dumps_bytes(obj: Any) -> bytes:
+    """Serialize a request body to JSON bytes, preferring orjson when installed."""
+    if _ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(data: bytes) -> Any:
+    """Parse JSON bytes, preferring orjson when installed."""
+    if _ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Sentinel marking the end of a streamed Ollama response
+_STREAM_END = object()
+
+# Markers for the Ollama NDJSON fast path (compact JSON, no spaces)
+_RESPONSE_MARK = b'"response":"'
+_DONE_MARK = b'"done":true'
+
+
+def _find_string_end(buf: bytes, start: int) -> int:
+    """Return the index of the next unescaped double quote at or after start, or -1."""
+    i = buf.find(b'"', start)
+    while i != -1:
+        j = i - 1
+        while j >= start and buf[j] == 0x5C:  # backslash
+            j -= 1
+        if (i - 1 - j) % 2 == 0:
+            return i
+        i = buf.find(b'"', i + 1)
+    return -1
+
+
+def _parse_stream_line(line: bytes) -> Tuple[str, bool]:
+    """
+    Extract the response text and done flag from one Ollama NDJSON line.
+
+    Intermediate lines only need the "response" string, so it is sliced out
+    directly; the full JSON parse is reserved for the final "done" line or
+    for lines that don't match the expected compact layout.
+
+    Raises:
+        ValueError: If the line is not valid JSON
+    """
+    if _DONE_MARK not in line:
+        i = line.find(_RESPONSE_MARK)
+        if i >= 0:
+            start = i + len(_RESPONSE_MARK)
+            end = _find_string_end(line, start)
+            if end >= 0:
+                raw = line[start:end]
+                if b'\\' not in raw:
+                    return raw.decode('utf-8', 'replace'), False
+                return _loads(b'"' + raw + b'"'), False
+    data = _loads(line)
+    return data.get('response', ''), bool(data.get('done', False))
+
+
+class BoundedChatMessageHistory(BaseChatMessageHistory):
+    """In-memory chat history that keeps only the newest max_messages messages.
+
+    Messages live in a deque(maxlen=max_messages), so appending past the limit
+    drops the oldest message in O(1) instead of re-slicing a list every turn.
+    A parallel deque holds each message's "Human: ..."/"Assistant: ..." prompt
+    line, formatted once on append, so prompts don't re-format the whole
+    history every turn; both deques trim together.
+    """
+
+    _PROMPT_PREFIXES = {'human': 'Human: ', 'ai': 'Assistant: '}
+
+    def __init__(self, max_messages: int):
+        self._messages: Deque[BaseMessage] = deque(maxlen=max_messages)
+        self._prompt_lines: Deque[Optional[str]] = deque(maxlen=max_messages)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return list(self._messages)
+
+    @messages.setter
+    def messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.clear()
+        self.add_messages(messages)
+
+    def _format_prompt_line(self, message: BaseMessage) -> Optional[str]:
+        prefix = self._PROMPT_PREFIXES.get(message.type)
+        return f"{prefix}{message.content}" if prefix else None
+
+    def add_message(self, message: BaseMessage) -> None:
+        self._messages.append(message)
+        self._prompt_lines.append(self._format_prompt_line(message))
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self._messages.extend(messages)
+        self._prompt_lines.extend(self._format_prompt_line(m) for m in messages)
+
+    def clear(self) -> None:
+        self._messages.clear()
+        self._prompt_lines.clear()
+
+    def prompt_lines(self, last: Optional[int] = None) -> List[str]:
+        """
+        Get the pre-formatted prompt lines for the stored messages.
+        
+        Args:
+            last: Only include lines for the last N messages (all if None)
+            
+        Returns:
+            List[str]: "Human: ..." / "Assistant: ..." lines, oldest first
+        """
+        lines = self._prompt_lines
+        if last is not None:
+            lines = itertools.islice(lines, max(len(lines) - last, 0), None)
+        return [line for line in lines if line is not None]
+
+
 class ChatHistoryManager:
     """Manages chat history and context using LangChain memory systems."""
+
+    _JSON_HEADERS = {"Content-Type": "application/json"}
+
+    # Upper bound (seconds) to wait for a web search on the background loop
+    _WEB_SEARCH_TIMEOUT = 120
+    
+    # Non-streaming generate request: the reply only arrives once generation
+    # has finished, so reads get the same 100 s the client uses elsewhere;
+    # the caller gives up a little after that
+    _GENERATE_HTTP_TIMEOUT = httpx.Timeout(100, connect=10)
+    _GENERATE_TIMEOUT = 110
+    
+    # Web search result cache: entry lifetime (seconds) and max entries
+    _SEARCH_CACHE_TTL = 300
+    _SEARCH_CACHE_SIZE = 256
+    
+    # Stored chat roles mapped to their LangChain message types
+    _MESSAGE_TYPES = {'user': HumanMessage, 'assistant': AIMessage}
     
     def __init__(self, 
                  model_name: str = "llama3.2:1b",
                  ollama_base_url: str = "http://127.0.0.1:11434",
                  max_messages: int = 20,
-                 enable_web_search: bool = True):
+                 enable_web_search: bool = True,
+                 max_sessions: int = 1024):
         """
         Initialize the chat history manager.
         
@@ -31,21 +195,41 @@ class ChatHistoryManager:
             ollama_base_url: Base URL for Ollama API
             max_messages: Maximum number of messages to keep in memory
             enable_web_search: Whether to enable automatic web search
+            max_sessions: Maximum number of chat sessions kept in memory
+                (least recently used sessions are evicted first)
         """
         self.model_name = model_name
         self.ollama_base_url = ollama_base_url
         self.max_messages = max_messages
         self.enable_web_search = enable_web_search
+        self.max_sessions = max_sessions
+        
+        # Shared async HTTP client (used on the background loop) so all Ollama
+        # generate requests, streaming or not, from every chat session reuse
+        # one pool of keep-alive connections
+        self._httpx = httpx.AsyncClient(
+            timeout=100,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=8)
+        )
         
-        # Initialize Ollama LLM
-        self.llm = OllamaLLM(
-            model=model_name,
-            base_url=ollama_base_url,
-            temperature=0.7
+        # Persistent event loop on a daemon thread for async web searches, so
+        # sync callers don't create and tear down a loop on every request
+        self._bg_loop = asyncio.new_event_loop()
+        self._bg_thread = threading.Thread(
+            target=self._bg_loop.run_forever,
+            name="chat-history-async-loop",
+            daemon=True
         )
+        self._bg_thread.start()
+        
+        # LRU + TTL cache of web search results keyed by normalized query
+        self._search_cache: "OrderedDict[Tuple[str, int, int], Tuple[float, List[Dict[str, str]]]]" = OrderedDict()
+        self._search_cache_lock = threading.Lock()
         
-        # Store chat histories for different chat sessions
-        self.chat_histories: Dict[str, InMemoryChatMessageHistory] = {}
+        # Store chat histories for different chat sessions, in LRU order
+        self.chat_histories: "OrderedDict[str, BoundedChatMessageHistory]" = OrderedDict()
+        # Request threads look up, reorder and evict sessions concurrently
+        self._chat_histories_lock = threading.Lock()
         
         # Chat prompt template
         self.prompt_template = ChatPromptTemplate.from_messages([
@@ -94,8 +278,99 @@ class ChatHistoryManager:
             r'\b(what|how).{0,20}(weather|temperature).{0,30}(tomorrow|today|tonight)\b',
             r'\b(will\s+it|is\s+it\s+going\s+to).{0,20}(rain|snow|storm|sunny)\b'
         ]
+        
+        # Question patterns that often need current info
+        self.question_patterns = [
+            # Weather and location-based queries
+            r'\bwhat.{0,50}(weather|temperature|forecast).{0,50}(tomorrow|today|tonight|this week)',
+            r'\bwhat.{0,50}(happening|new|latest)',
+            r'\bhow.{0,50}(much|many).{0,20}(cost|price|worth)',
+            r'\bwhen.{0,20}(did|will|was).{0,50}(released|launch|announce)',
+            r'\bwhere.{0,20}(can|to).{0,30}(buy|find|get)',
+            r'\bwho.{0,20}(won|elected|appointed|hired)',
+            
+            # Time-sensitive questions
+            r'\b(what|when|how).{0,30}(tomorrow|today|tonight|this\s+week|next\s+week)',
+            r'\b(will\s+it|is\s+it).{0,30}(rain|snow|storm|sunny|cloudy)',
+            r'\bwhat.{0,20}(time|when).{0,30}(open|close|start|end)',
+            
+            # Location + temporal queries
+            r'\b(weather|temperature|forecast)\s+in\s+\w+',
+            r'\bin\s+\w+.{0,20}(tomorrow|today|tonight)',
+            r'\b(what|how).{0,20}(is|will\s+be).{0,20}(the\s+weather|temperature)'
+        ]
+        
+        # Literal prefilter: every trigger pattern requires at least one of these
+        # substrings (keep in sync when editing the patterns above). Inputs that
+        # contain none of them can't match any pattern, so the regex is skipped.
+        self._trigger_literals = (
+            'latest', 'recent', 'new', 'current', 'today', 'year', '2024', '2025',
+            'trending', 'update', 'now', 'breaking', 'just', 'events', 'headlines',
+            'price', 'stock', 'cryptocurrency', 'bitcoin', 'exchange',
+            'weather', 'forecast', 'temperature', 'climate',
+            'rain', 'snow', 'storm', 'sunny', 'cloudy', 'tomorrow', 'tonight',
+            'election', 'political', 'government', 'policy',
+            'war', 'conflict', 'crisis', 'emergency', 'disaster',
+            'breakthrough', 'published',
+            'what', 'how', 'when', 'where', 'who'
+        )
+        self._literal_automaton = None
+        if _AHOCORASICK_AVAILABLE:
+            self._literal_automaton = ahocorasick.Automaton()
+            for literal in self._trigger_literals:
+                self._literal_automaton.add_word(literal, literal)
+            self._literal_automaton.make_automaton()
+        self._min_trigger_len = min(len(literal) for literal in self._trigger_literals)
+        
+        # Fuse all trigger patterns into one compiled alternation so the input is
+        # scanned in a single pass; each pattern gets a named group (g0, g1, ...)
+        # so the matching pattern can still be logged. IGNORECASE replaces
+        # lowercasing the input. The patterns' own groups are made
+        # non-capturing and the one unbounded gap is capped, so the engine
+        # keeps no per-group capture state and can't scan past a line's end.
+        self._trigger_patterns = self.search_triggers + self.question_patterns
+        self._trigger_regex = self._compile_trigger_regex(
+            "(?i)" + "|".join(
+                f"(?P<g{i}>{self._optimize_trigger_pattern(pattern)})"
+                for i, pattern in enumerate(self._trigger_patterns)
+            )
+        )
+        
+        # Standalone keywords from the plain word-list patterns (e.g. "weather",
+        # "bitcoin"); a whitespace-separated token equal to one of them always
+        # matches its pattern, so the regex scan can be skipped on those hits
+        self._quick_triggers: Dict[str, str] = {}
+        for pattern in self._trigger_patterns:
+            words = re.fullmatch(r'\\b\(([\w|\\+]+)\)\\b', pattern)
+            if not words:
+                continue
+            for word in words.group(1).split('|'):
+                if word.isalnum():
+                    self._quick_triggers.setdefault(word, pattern)
+        
+        # Memoize trigger matching per instance; repeated or re-sent messages
+        # become a dict lookup instead of a regex scan
+        self._match_trigger = functools.lru_cache(maxsize=2048)(self._match_trigger_uncached)
     
-    def get_or_create_history(self, chat_id: str) -> InMemoryChatMessageHistory:
+    def _run_async(self, coro, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the background event loop and wait for its result.
+        
+        Args:
+            coro: Coroutine to schedule
+            timeout: Seconds to wait before cancelling (None waits indefinitely)
+            
+        Returns:
+            The coroutine's return value
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._bg_loop)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+    
+    def get_or_create_history(self, chat_id: str) -> BoundedChatMessageHistory:
         """
         Get or create a chat history for a specific chat ID.
         
@@ -103,13 +378,23 @@ class ChatHistoryManager:
             chat_id: Unique identifier for the chat session
             
         Returns:
-            InMemoryChatMessageHistory: The chat history for this session
+            BoundedChatMessageHistory: The chat history for this session
         """
-        if chat_id not in self.chat_histories:
-            self.chat_histories[chat_id] = InMemoryChatMessageHistory()
-            logger.info(f"Created new chat history for chat_id: {chat_id}")
-        
-        return self.chat_histories[chat_id]
+        with self._chat_histories_lock:
+            history = self.chat_histories.get(chat_id)
+            if history is not None:
+                self.chat_histories.move_to_end(chat_id)
+                return history
+            
+            # Evict least recently used sessions to stay within max_sessions
+            while len(self.chat_histories) >= self.max_sessions:
+                evicted_id, _ = self.chat_histories.popitem(last=False)
+                logger.info(f"Evicted chat history for chat_id: {evicted_id}")
+            
+            history = BoundedChatMessageHistory(self.max_messages)
+            self.chat_histories[chat_id] = history
+        logger.info(f"Created new chat history for chat_id: {chat_id}")
+        return history
     
     def load_chat_history(self, chat_id: str, messages: List[Dict[str, Any]]) -> None:
         """
@@ -124,22 +409,66 @@ class ChatHistoryManager:
         # Clear existing history
         history.clear()
         
-        # Add messages to history
-        for message in messages:
-            role = message.get('role', 'user')
-            content = message.get('content', '')
-            
-            if role == 'user':
-                history.add_user_message(content)
-            elif role == 'assistant':
-                history.add_ai_message(content)
-        
-        # Keep only the last max_messages messages
-        if len(history.messages) > self.max_messages:
-            history.messages = history.messages[-self.max_messages:]
+        # Build only the last max_messages messages (newest first), then add
+        # them in a single batch instead of one add_* call per message
+        message_types = self._MESSAGE_TYPES
+        batch: List[BaseMessage] = []
+        for message in reversed(messages):
+            message_cls = message_types.get(message.get('role', 'user'))
+            if message_cls is None:
+                continue
+            batch.append(message_cls(content=message.get('content', '')))
+            if len(batch) >= self.max_messages:
+                break
+        batch.reverse()
+        history.add_messages(batch)
         
         logger.info(f"Loaded {len(messages)} messages into chat_id: {chat_id}")
     
+    @staticmethod
+    def _optimize_trigger_pattern(pattern: str) -> str:
+        """Rewrite a trigger pattern with non-capturing groups and bounded gaps."""
+        pattern = re.sub(r'(?<!\\)\((?!\?)', '(?:', pattern)
+        return pattern.replace('.*', r'[^\n]{0,100}')
+    
+    @staticmethod
+    def _compile_trigger_regex(pattern: str):
+        """Compile the fused trigger regex with RE2 if available, else re."""
+        if _RE2_AVAILABLE:
+            try:
+                return re2.compile(pattern)
+            except Exception as e:
+                logger.warning(f"RE2 could not compile trigger regex, falling back to re: {e}")
+        return re.compile(pattern)
+    
+    def _has_trigger_literal(self, text_lower: str) -> bool:
+        """Return True if the lowercased text contains any trigger literal."""
+        if self._literal_automaton is not None:
+            return next(self._literal_automaton.iter(text_lower), None) is not None
+        return any(literal in text_lower for literal in self._trigger_literals)
+    
+    def _match_trigger_uncached(self, user_input_lower: str) -> Optional[str]:
+        """Return the trigger pattern matching the lowercased input, or None."""
+        # Too short to contain any trigger ("hi", "ok", ...)
+        if len(user_input_lower) < self._min_trigger_len:
+            return None
+        
+        # Whole-word keyword hits need no regex
+        for word in user_input_lower.split():
+            pattern = self._quick_triggers.get(word)
+            if pattern is not None:
+                return pattern
+        
+        # Cheap literal scan next; most casual chat contains no trigger word
+        if not self._has_trigger_literal(user_input_lower):
+            return None
+        
+        # Check for search trigger and question patterns in one pass
+        match = self._trigger_regex.search(user_input_lower)
+        if match:
+            return self._trigger_patterns[int(match.lastgroup[1:])]
+        return None
+    
     def should_search_web(self, user_input: str, force_search: bool = False) -> bool:
         """
         Determine if the user input warrants a web search.
@@ -160,48 +489,44 @@ class ChatHistoryManager:
             logger.info("Web search disabled")
             return False
         
-        user_input_lower = user_input.lower()
         logger.info(f"Evaluating web search for input: '{user_input}'")
         
-        # Check for search trigger patterns
-        for pattern in self.search_triggers:
-            if re.search(pattern, user_input_lower):
-                logger.info(f"Web search triggered by pattern: {pattern}")
-                return True
-        
-        # Check for question words that might need current info
-        question_patterns = [
-            # Weather and location-based queries
-            r'\bwhat.{0,50}(weather|temperature|forecast).{0,50}(tomorrow|today|tonight|this week)',
-            r'\bwhat.{0,50}(happening|new|latest)',
-            r'\bhow.{0,50}(much|many).{0,20}(cost|price|worth)',
-            r'\bwhen.{0,20}(did|will|was).{0,50}(released|launch|announce)',
-            r'\bwhere.{0,20}(can|to).{0,30}(buy|find|get)',
-            r'\bwho.{0,20}(won|elected|appointed|hired)',
-            
-            # Time-sensitive questions
-            r'\b(what|when|how).{0,30}(tomorrow|today|tonight|this\s+week|next\s+week)',
-            r'\b(will\s+it|is\s+it).{0,30}(rain|snow|storm|sunny|cloudy)',
-            r'\bwhat.{0,20}(time|when).{0,30}(open|close|start|end)',
-            
-            # Location + temporal queries
-            r'\b(weather|temperature|forecast)\s+in\s+\w+',
-            r'\bin\s+\w+.{0,20}(tomorrow|today|tonight)',
-            r'\b(what|how).{0,20}(is|will\s+be).{0,20}(the\s+weather|temperature)'
-        ]
-        
-        for pattern in question_patterns:
-            if re.search(pattern, user_input_lower):
-                logger.info(f"Web search triggered by question pattern: {pattern}")
-                return True
+        pattern = self._match_trigger(user_input.lower())
+        if pattern is not None:
+            logger.info(f"Web search triggered by pattern: {pattern}")
+            return True
         
         logger.info("No web search patterns matched")
         return False
     
+    def _get_cached_search(self, key: Tuple[str, int, int]) -> Optional[List[Dict[str, str]]]:
+        """Return cached search results for key if present and not expired."""
+        with self._search_cache_lock:
+            entry = self._search_cache.get(key)
+            if entry is None:
+                return None
+            stored_at, documents = entry
+            if time.monotonic() - stored_at >= self._SEARCH_CACHE_TTL:
+                del self._search_cache[key]
+                return None
+            self._search_cache.move_to_end(key)
+            return documents
+    
+    def _set_cached_search(self, key: Tuple[str, int, int], documents: List[Dict[str, str]]) -> None:
+        """Store search results, evicting the least recently used entries."""
+        with self._search_cache_lock:
+            self._search_cache[key] = (time.monotonic(), documents)
+            self._search_cache.move_to_end(key)
+            while len(self._search_cache) > self._SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+    
     async def perform_web_search(self, query: str, min_results: int = 2, max_results: int = 5) -> List[Dict[str, str]]:
         """
         Perform web search using the search pipeline.
         
+        Results are cached for _SEARCH_CACHE_TTL seconds, keyed on the
+        whitespace/case-normalized query and the result bounds.
+        
         Args:
             query: Search query
             max_results: Maximum number of results
@@ -209,10 +534,18 @@ class ChatHistoryManager:
         Returns:
             List of search results
         """
+        cache_key = (" ".join(query.lower().split()), min_results, max_results)
+        cached = self._get_cached_search(cache_key)
+        if cached is not None:
+            logger.info(f"Web search cache hit for query: {query}")
+            return cached
+        
         try:
             from search_pipeline import search_and_scrape
             documents = await search_and_scrape(query, max_results=max_results, min_results=min_results, min_words=100, min_quality_score=0.3, adaptive=True)
             logger.info(f"Web search found {len(documents)} results for query: {query}")
+            if documents:
+                self._set_cached_search(cache_key, documents)
             return documents
         except ImportError:
             logger.warning("Web search not available: search_pipeline module not found")
@@ -235,21 +568,57 @@ class ChatHistoryManager:
         if not search_results:
             return f"No web search results found for: {query}"
         
-        context = f"Web Search Results for '{query}' (sorted by quality):\n\n"
+        parts = [f"Web Search Results for '{query}' (sorted by quality):\n\n"]
         
         for i, doc in enumerate(search_results, 1):
             # Truncate content to prevent context overflow
-            content = doc['text'][:1000] + "..." if len(doc['text']) > 1000 else doc['text']
+            text = doc['text']
+            content = text[:1000] + "..." if len(text) > 1000 else text
             quality_score = doc.get('quality_score', 0.5)
             
-            context += f"Source {i} (Quality: {quality_score:.1f}/1.0): {doc['title']}\n"
-            context += f"URL: {doc['url']}\n"
-            context += f"Content: {content}\n\n"
+            parts.append(
+                f"Source {i} (Quality: {quality_score:.1f}/1.0): {doc['title']}\n"
+                f"URL: {doc['url']}\n"
+                f"Content: {content}\n\n"
+            )
         
-        context += "Please use this current information to answer the user's question accurately. "
-        context += "IMPORTANT: At the end of your response, include a 'Sources:' section that lists "
-        context += "the relevant sources you used, with their titles and URLs in a readable format.\n\n"
-        return context
+        parts.append(
+            "Please use this current information to answer the user's question accurately. "
+            "IMPORTANT: At the end of your response, include a 'Sources:' section that lists "
+            "the relevant sources you used, with their titles and URLs in a readable format.\n\n"
+        )
+        return "".join(parts)
+    
+    def _maybe_search(self, user_input: str, force_search: bool = False) -> str:
+        """
+        Run a web search for the input if warranted and format it as context.
+        
+        Shared by get_response and get_response_stream. A failed search is
+        logged and the response proceeds without search context.
+        
+        Args:
+            user_input: The user's input message
+            force_search: Whether to force web search regardless of content
+            
+        Returns:
+            str: Formatted search context, or "" if no search was performed
+        """
+        if not self.should_search_web(user_input, force_search):
+            return ""
+        
+        search_type = "forced" if force_search else "automatic"
+        logger.info(f"Performing {search_type} web search for query: {user_input}")
+        
+        try:
+            # Run async web search on the background loop
+            search_results = self._run_async(
+                self.perform_web_search(user_input, min_results=2, max_results=6),
+                timeout=self._WEB_SEARCH_TIMEOUT
+            )
+        except Exception as e:
+            logger.error(f"Web search failed: {e}")
+            return ""
+        return self.format_web_search_context(search_results, user_input)
     
     def get_response(self, chat_id: str, user_input: str, model_name: Optional[str] = None, force_search: bool = False) -> str:
         """
@@ -270,24 +639,8 @@ class ChatHistoryManager:
         current_model = model_name or self.model_name
         
         try:
-            # Check if web search is needed
-            search_context = ""
-            should_search = self.should_search_web(user_input, force_search)
-            
-            if should_search:
-                search_type = "forced" if force_search else "automatic"
-                logger.info(f"Performing {search_type} web search for query: {user_input}")
-                
-                # Run async web search in sync context
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    search_results = loop.run_until_complete(
-                        self.perform_web_search(user_input, min_results=2, max_results=6)
-                    )
-                    search_context = self.format_web_search_context(search_results, user_input)
-                finally:
-                    loop.close()
+            # Check if web search is needed and perform it
+            search_context = self._maybe_search(user_input, force_search)
             
             # Create the prompt with history and search context
             context_messages = []
@@ -300,13 +653,8 @@ class ChatHistoryManager:
                 system_content += "\n\nWhen web search is forced: strictly incorporate results into your answer. If no credible sources are found, clearly say so and avoid speculation. Always include a final 'Sources:' section with the links you used."
             context_messages.append(f"System: {system_content}")
             
-            # Add conversation history
-            for msg in history.messages:
-                if hasattr(msg, 'content'):
-                    if msg.type == 'human':
-                        context_messages.append(f"Human: {msg.content}")
-                    elif msg.type == 'ai':
-                        context_messages.append(f"Assistant: {msg.content}")
+            # Add conversation history (lines are formatted once, on append)
+            context_messages.extend(history.prompt_lines())
             
             # Add current input
             context_messages.append(f"Human: {user_input}")
@@ -314,26 +662,22 @@ class ChatHistoryManager:
             
             prompt_str = "\n".join(context_messages)
             
-            # If using a different model, create a temporary LLM instance
-            if model_name and model_name != self.model_name:
-                temp_llm = OllamaLLM(
-                    model=current_model,
-                    base_url=self.ollama_base_url,
-                    temperature=0.7
-                )
-                response = temp_llm.invoke(prompt_str)
-            else:
-                # Get response from default LLM
-                response = self.llm.invoke(prompt_str)
+            # Generate through the shared pooled client on the background loop
+            body = _dumps_bytes({
+                "model": current_model,
+                "prompt": prompt_str,
+                "stream": False,
+                "options": {"temperature": 0.7}
+            })
+            response = self._run_async(
+                self._generate_ollama(f"{self.ollama_base_url}/api/generate", body),
+                timeout=self._GENERATE_TIMEOUT
+            )
             
             # Add to history
             history.add_user_message(user_input)
             history.add_ai_message(response)
             
-            # Keep only the last max_messages messages
-            if len(history.messages) > self.max_messages:
-                history.messages = history.messages[-self.max_messages:]
-            
             logger.info(f"Generated response for chat_id: {chat_id} using model: {current_model}")
             return response
             
@@ -360,26 +704,7 @@ class ChatHistoryManager:
         current_model = model_name or self.model_name
         
         # Check if web search is needed and perform it
-        search_context = ""
-        should_search = self.should_search_web(user_input, force_search)
-        
-        if should_search:
-            search_type = "Manual" if force_search else "Auto"
-            logger.info(f"Performing {search_type.lower()} web search for streaming query: {user_input}")
-            
-            # Run async web search in sync context
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                search_results = loop.run_until_complete(
-                    self.perform_web_search(user_input, min_results=2, max_results=6)
-                )
-                search_context = self.format_web_search_context(search_results, user_input)
-                    
-            except Exception as e:
-                logger.error(f"Web search failed in streaming: {e}")
-            finally:
-                loop.close()
+        search_context = self._maybe_search(user_input, force_search)
         
         # Build context from history and search results
         context = ""
@@ -388,12 +713,9 @@ class ChatHistoryManager:
         if search_context:
             context += f"{search_context}\n\n"
         
-        # Add conversation history
-        for msg in history.messages[-10:]:  # Use last 10 messages for context
-            if isinstance(msg, HumanMessage):
-                context += f"Human: {msg.content}\n"
-            elif isinstance(msg, AIMessage):
-                context += f"Assistant: {msg.content}\n"
+        # Add conversation history (last 10 messages, pre-formatted on append)
+        for line in history.prompt_lines(last=10):
+            context += f"{line}\n"
         
         # Build the full prompt with context
         system_prompt = "You are a helpful AI assistant. Use the conversation history and any provided web search results to provide contextual, accurate, and up-to-date responses."
@@ -409,44 +731,95 @@ Current Question: {user_input}
 Response:"""
         
         try:
-            # Make direct request to Ollama for streaming
-            response = requests.post(
-                f"{self.ollama_base_url}/api/generate",
-                json={
-                    "model": current_model,
-                    "prompt": full_prompt,
-                    "stream": True
-                },
-                stream=True,
-                timeout=100
+            # Stream from Ollama on the background loop; lines are handed back
+            # through a queue so this generator never blocks on the socket
+            # itself. The body is pre-serialized to skip a json.dumps pass.
+            body = _dumps_bytes({
+                "model": current_model,
+                "prompt": full_prompt,
+                "stream": True
+            })
+            lines: queue.Queue = queue.Queue()
+            future = asyncio.run_coroutine_threadsafe(
+                self._stream_ollama(f"{self.ollama_base_url}/api/generate", body, lines),
+                self._bg_loop
             )
             
-            full_response = ""
-            for line in response.iter_lines():
-                if line:
+            # Collect chunks in a list and join once; += on a str is quadratic
+            # over a long streamed answer
+            response_parts: List[str] = []
+            try:
+                while True:
+                    line = lines.get()
+                    if line is _STREAM_END:
+                        break
+                    if isinstance(line, Exception):
+                        raise line
                     try:
-                        json_response = json.loads(line.decode('utf-8'))
-                        if 'response' in json_response:
-                            chunk = json_response['response']
-                            full_response += chunk
-                            yield chunk
-                        
-                        if json_response.get('done', False):
-                            # Add the complete interaction to history
-                            history.add_user_message(user_input)
-                            history.add_ai_message(full_response)
-                            
-                            # Keep only the last max_messages messages
-                            if len(history.messages) > self.max_messages:
-                                history.messages = history.messages[-self.max_messages:]
-                            break
-                    except json.JSONDecodeError:
+                        chunk, done = _parse_stream_line(line)
+                    except ValueError:
                         continue
+                    if chunk:
+                        response_parts.append(chunk)
+                        yield chunk
+                    
+                    if done:
+                        # Add the complete interaction to history
+                        history.add_user_message(user_input)
+                        history.add_ai_message("".join(response_parts))
+                        break
+            finally:
+                # Stop the producer if we finished early or the client went away
+                future.cancel()
                         
         except Exception as e:
             logger.error(f"Error in streaming response for chat_id {chat_id}: {e}")
             yield "I apologize, but I encountered an error while processing your request."
     
+    async def _generate_ollama(self, url: str, body: bytes) -> str:
+        """
+        Run a non-streaming Ollama generate request and return the response text.
+        
+        Args:
+            url: Ollama generate endpoint
+            body: Pre-serialized JSON request body
+            
+        Returns:
+            str: The generated text
+        """
+        response = await self._httpx.post(url, content=body, headers=self._JSON_HEADERS,
+                                          timeout=self._GENERATE_HTTP_TIMEOUT)
+        response.raise_for_status()
+        return _loads(response.content).get("response", "")
+    
+    async def _stream_ollama(self, url: str, body: bytes, lines: queue.Queue) -> None:
+        """
+        Stream an Ollama NDJSON response, putting each raw line on a queue.
+        
+        Runs on the background loop. Errors are put on the queue as exception
+        objects, and _STREAM_END is always put last.
+        
+        Args:
+            url: Ollama generate endpoint
+            body: Pre-serialized JSON request body
+            lines: Queue drained by the calling generator
+        """
+        try:
+            async with self._httpx.stream("POST", url, content=body, headers=self._JSON_HEADERS) as response:
+                pending = b""
+                async for data in response.aiter_bytes():
+                    pending += data
+                    *complete, pending = pending.split(b"\n")
+                    for line in complete:
+                        if line:
+                            lines.put(line)
+                if pending:
+                    lines.put(pending)
+        except Exception as e:
+            lines.put(e)
+        finally:
+            lines.put(_STREAM_END)
+    
     def get_chat_summary(self, chat_id: str) -> str:
         """
         Get a summary of the chat conversation.
@@ -457,17 +830,25 @@ Response:"""
         Returns:
             str: Summary of the conversation
         """
-        if chat_id not in self.chat_histories:
+        # One lookup, so a concurrent eviction can't remove it in between
+        history = self.chat_histories.get(chat_id)
+        if history is None:
             return "No conversation history found."
         
-        history = self.chat_histories[chat_id]
+        messages = history.messages
         
-        if not history.messages:
+        if not messages:
             return "No conversation history."
         
-        message_count = len(history.messages)
-        user_messages = sum(1 for msg in history.messages if isinstance(msg, HumanMessage))
-        ai_messages = sum(1 for msg in history.messages if isinstance(msg, AIMessage))
+        # Count both roles in one pass using the message type tag
+        message_count = len(messages)
+        user_messages = ai_messages = 0
+        for msg in messages:
+            msg_type = msg.type
+            if msg_type == 'human':
+                user_messages += 1
+            elif msg_type == 'ai':
+                ai_messages += 1
         
         return f"Conversation with {message_count} messages ({user_messages} from user, {ai_messages} from assistant)."
     
@@ -481,21 +862,23 @@ Response:"""
         Returns:
             bool: True if session was cleared, False if not found
         """
-        if chat_id in self.chat_histories:
-            self.chat_histories[chat_id].clear()
-            del self.chat_histories[chat_id]
+        with self._chat_histories_lock:
+            history = self.chat_histories.pop(chat_id, None)
+        if history is not None:
+            history.clear()
             logger.info(f"Cleared session for chat_id: {chat_id}")
             return True
         return False
     
-    def get_active_sessions(self) -> List[str]:
+    def get_active_sessions(self) -> KeysView[str]:
         """
-        Get list of active chat session IDs.
+        Get the active chat session IDs.
         
         Returns:
-            List[str]: List of active chat session IDs
+            KeysView[str]: Live view of active chat session IDs (wrap in list()
+            if a snapshot is needed)
         """
-        return list(self.chat_histories.keys())
+        return self.chat_histories.keys()
 
     def set_model(self, model_name: str) -> bool:
         """
@@ -509,12 +892,6 @@ Response:"""
         """
         try:
             self.model_name = model_name
-            # Update the LLM instance
-            self.llm = OllamaLLM(
-                model=model_name,
-                base_url=self.ollama_base_url,
-                temperature=0.7
-            )
             logger.info(f"Changed model to: {model_name}")
             return True
         except Exception as e:
@@ -1,93 +1,198 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Hashable, Iterator, Set, Tuple
+import atexit
+import copy
 import json
+import threading
 import time
+from collections import Counter, OrderedDict
 from database import DatabaseManager
 import logging
+import sqlite3
 
 class DataService:
     """High-level data service with caching and improved abstractions."""
     
     def __init__(self, db_path: str = "instance/notetaker.db"):
         self.db = DatabaseManager(db_path)
-        self._cache = {}
-        self._cache_ttl = {}
+        # key -> (expires_at, value, tags) in LRU order; one lookup per hit
+        self._cache: "OrderedDict[Hashable, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Reverse index: invalidation tag -> cache keys carrying that tag
+        self._tag_index: Dict[str, Set[Hashable]] = {}
+        # Bumped by every invalidation; a result computed before one is stale
+        self._cache_generation = 0
         self.cache_duration = 300  # 5 minutes default TTL
+        self.cache_max_entries = 1024
+        # Write-behind for chat saves: node_id -> latest messages, written
+        # once saves have been quiet for chat_save_delay seconds
+        self.chat_save_delay = 0.5
+        self._pending_chats: Dict[str, List[Dict]] = {}
+        # Chats whose last queued write failed; their next save is written
+        # immediately so the caller sees the result
+        self._failed_chats: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        # Held while chats are written, so a reader that flushes waits for a
+        # write already in progress on the timer thread
+        self._flush_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        # Queued saves are written before the interpreter exits
+        atexit.register(self.flush_chats)
     
-    def _cache_key(self, *args) -> str:
-        """Generate a cache key from arguments."""
-        return "|".join(str(arg) for arg in args)
+    def _cache_key(self, *args, **kwargs) -> Hashable:
+        """Generate a cache key from arguments.
+        
+        The key is a tuple (hashed in C, no str() per argument); keyword
+        arguments are sorted so their order at the call site doesn't matter.
+        """
+        if kwargs:
+            return args + (tuple(sorted(kwargs.items())),)
+        return args
     
-    def _is_cache_valid(self, key: str) -> bool:
-        """Check if cache entry is still valid."""
-        if key not in self._cache_ttl:
-            return False
-        return time.time() - self._cache_ttl[key] < self.cache_duration
+    def _set_cache(self, key: Hashable, value: Any, tags: Tuple[str, ...] = (),
+                   ttl: Optional[float] = None, generation: Optional[int] = None):
+        """Set a cache entry, indexed under the given tags.
+        
+        The entry expires after ``ttl`` seconds (default ``cache_duration``);
+        pass ``math.inf`` to keep it until it is invalidated or evicted.
+        If ``generation`` (read before computing the value) is given and an
+        invalidation has happened since, the value may be stale and is not
+        stored.
+        """
+        if ttl is None:
+            ttl = self.cache_duration
+        with self._cache_lock:
+            if generation is not None and generation != self._cache_generation:
+                return
+            old = self._cache.get(key)
+            if old is not None:
+                self._unindex_cache_key(key, old[2])
+            self._cache[key] = (time.monotonic() + ttl, value, tags)
+            self._cache.move_to_end(key)
+            for tag in tags:
+                self._tag_index.setdefault(tag, set()).add(key)
+            # Evict least recently used entries past the size bound
+            while len(self._cache) > self.cache_max_entries:
+                evicted_key, (_, _, evicted_tags) = self._cache.popitem(last=False)
+                self._unindex_cache_key(evicted_key, evicted_tags)
     
-    def _set_cache(self, key: str, value: Any):
-        """Set a cache entry with timestamp."""
-        self._cache[key] = value
-        self._cache_ttl[key] = time.time()
+    def _unindex_cache_key(self, key: Hashable, tags: Tuple[str, ...]):
+        """Remove a cache key from the tag index (caller holds _cache_lock)."""
+        for tag in tags:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
     
-    def _get_cache(self, key: str) -> Optional[Any]:
-        """Get a cache entry if valid."""
-        if self._is_cache_valid(key):
-            return self._cache.get(key)
-        return None
+    def _get_cache(self, key: Hashable) -> Optional[Any]:
+        """Get a cache entry if present and not expired."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires_at, value, tags = entry
+            if time.monotonic() >= expires_at:
+                del self._cache[key]
+                self._unindex_cache_key(key, tags)
+                return None
+            self._cache.move_to_end(key)
+            return value
     
-    def _invalidate_cache(self, pattern: str = None):
-        """Invalidate cache entries matching a pattern."""
-        if pattern is None:
-            self._cache.clear()
-            self._cache_ttl.clear()
-        else:
-            keys_to_remove = [k for k in self._cache.keys() if pattern in k]
-            for key in keys_to_remove:
-                self._cache.pop(key, None)
-                self._cache_ttl.pop(key, None)
+    def _invalidate_cache(self, tag: str = None):
+        """Invalidate cache entries indexed under a tag (all entries if None)."""
+        with self._cache_lock:
+            self._cache_generation += 1
+            if tag is None:
+                self._cache.clear()
+                self._tag_index.clear()
+            else:
+                for key in self._tag_index.pop(tag, ()):
+                    entry = self._cache.pop(key, None)
+                    if entry is not None:
+                        # Drop the key from its other tags too
+                        self._unindex_cache_key(key, entry[2])
     
-    def _cached_call(self, cache_key_prefix: str, func, *args, **kwargs):
-        """Helper method for caching function results."""
+    def _cached_call(self, cache_key_prefix: str, func, *args,
+                     tags: Optional[Tuple[str, ...]] = None,
+                     ttl: Optional[float] = None, **kwargs):
+        """Helper method for caching function results.
+        
+        The entry is indexed under ``tags`` for invalidation, defaulting to the
+        key prefix (e.g. "tree", "recent"), and expires after ``ttl`` seconds
+        (see _set_cache).
+        """
         # Generate cache key
-        cache_key = self._cache_key(cache_key_prefix, *args, *kwargs.values())
+        cache_key = self._cache_key(cache_key_prefix, *args, **kwargs)
         
         # Try to get from cache
         cached_result = self._get_cache(cache_key)
         if cached_result is not None:
             return cached_result
         
-        # Execute function and cache result
+        # Reads must see chat saves that are still queued
+        self.flush_chats()
+        
+        # Execute function and cache result, unless a write invalidated the
+        # cache while it ran
+        generation = self._cache_generation
         result = func(*args, **kwargs)
-        self._set_cache(cache_key, result)
+        self._set_cache(cache_key, result, tags or (cache_key_prefix,), ttl, generation)
         return result
     
     def get_tree(self) -> List[Dict]:
-        """Get the complete tree structure with caching."""
-        return self._cached_call("tree", self._get_tree_uncached)
-    
-    def _get_tree_uncached(self) -> List[Dict]:
-        """Internal method to get tree without caching."""
-        tree = self.db.get_tree()
+        """Get the complete tree structure with caching.
         
-        # Enrich nodes with content for better performance
-        for node in self._flatten_tree(tree):
-            if node['type'] == 'note':
-                content = self.db.get_note_content(node['id'])
-                if content:
-                    node['content'] = content['content']
-            elif node['type'] == 'chat':
-                messages = self.db.get_chat_messages(node['id'])
-                node['content'] = {'messages': messages}
+        Writes through this service invalidate "tree"; the entry still expires
+        after ``cache_duration`` so writes from other processes (such as
+        update_sort_order.py) show up. A failed read returns an empty tree
+        without caching it.
         
-        return tree
+        Returns a deep copy, so callers may modify it without corrupting the
+        cached tree.
+        """
+        return copy.deepcopy(self._get_tree_shared())
     
-    def _flatten_tree(self, tree: List[Dict]) -> List[Dict]:
-        """Flatten tree structure for easier processing."""
-        nodes = []
-        for node in tree:
-            nodes.append(node)
-            if 'children' in node:
-                nodes.extend(self._flatten_tree(node['children']))
-        return nodes
+    def _get_tree_shared(self) -> List[Dict]:
+        """Get the cached tree itself, for internal read-only walks."""
+        try:
+            return self._cached_call("tree", self._get_tree_uncached)
+        except sqlite3.Error as e:
+            logging.error(f"Error getting tree: {e}")
+            return []
+    
+    def get_tree_json(self) -> bytes:
+        """Get the complete tree serialized as JSON bytes, with caching.
+        
+        SQLite renders the JSON directly (see DatabaseManager.get_tree_json),
+        so the tree endpoint never materializes the dict tree; the bytes are
+        cached like the tree itself (see get_tree).
+        """
+        try:
+            return self._cached_call("tree_json", self.db.get_tree_json, raise_errors=True,
+                                     tags=("tree",))
+        except sqlite3.Error as e:
+            logging.error(f"Error getting tree JSON: {e}")
+            return b'[]'
+    
+    def _get_tree_uncached(self) -> List[Dict]:
+        """Internal method to get tree without caching (raises sqlite3.Error)."""
+        # Note content and chat messages are joined in the same query as the
+        # nodes instead of being fetched per node
+        return self.db.get_tree(include_content=True, raise_errors=True)
+    
+    def _iter_tree(self, tree: List[Dict]) -> Iterator[Dict]:
+        """Yield every node of the tree in pre-order (parents first).
+        
+        Walks with an explicit stack instead of recursing, and never builds
+        an intermediate list.
+        """
+        stack = list(reversed(tree))
+        while stack:
+            node = stack.pop()
+            yield node
+            children = node.get('children')
+            if children:
+                stack.extend(reversed(children))
     
     def create_node(self, node_id: str, name: str, node_type: str, 
                    parent_id: Optional[str] = None, **kwargs) -> bool:
@@ -97,6 +202,7 @@ class DataService:
         if success:
             self._invalidate_cache("tree")
             self._invalidate_cache("recent")
+            self._invalidate_cache("search")
         return success
     
     def update_node(self, node_id: str, **kwargs) -> bool:
@@ -104,12 +210,16 @@ class DataService:
         success = self.db.update_node(node_id, **kwargs)
         if success:
             self._invalidate_cache("tree")
-            self._invalidate_cache("recent")
             self._invalidate_cache(f"node_{node_id}")
+            # Toggling collapsed leaves updated_at and names alone
+            if kwargs.keys() != {'collapsed'}:
+                self._invalidate_cache("recent")
+                self._invalidate_cache("search")
         return success
     
     def delete_node(self, node_id: str) -> bool:
         """Delete a node and invalidate relevant caches."""
+        self.flush_chats()
         success = self.db.delete_node(node_id)
         if success:
             self._invalidate_cache()  # Clear all cache for safety
@@ -130,15 +240,19 @@ class DataService:
         # Save note content
         content_success = self.db.save_note_content(node_id, content_dict)
         
-        if node_success and content_success:
+        # Invalidate if either write landed, since the tree is now only kept
+        # until the next write
+        if node_success or content_success:
             self._invalidate_cache("tree")
+            self._invalidate_cache("recent")
+            self._invalidate_cache("search")
             self._invalidate_cache(f"note_{node_id}")
-            return True
-        return False
+        return node_success and content_success
     
     def get_note(self, node_id: str) -> Optional[Dict]:
         """Get a complete note with metadata."""
-        return self._cached_call("note", self._get_note_uncached, node_id)
+        return self._cached_call("note", self._get_note_uncached, node_id,
+                                 tags=(f"note_{node_id}", f"node_{node_id}"))
     
     def _get_note_uncached(self, node_id: str) -> Optional[Dict]:
         """Internal method to get note without caching."""
@@ -153,16 +267,79 @@ class DataService:
         return node
     
     def save_chat(self, node_id: str, messages: List[Dict]) -> bool:
-        """Save chat messages."""
-        success = self.db.save_chat_messages(node_id, messages)
-        if success:
-            self._invalidate_cache(f"chat_{node_id}")
-            self._invalidate_cache("tree")
+        """Save chat messages.
+        
+        Chats are saved after nearly every message, so saves are queued and
+        coalesced: only the latest messages per chat are written, once no
+        save has arrived for ``chat_save_delay`` seconds (or earlier, when
+        something reads or modifies chats, and at exit). If the last queued
+        write of this chat failed, this save is written immediately instead
+        and its result returned.
+        """
+        with self._pending_lock:
+            write_now = node_id in self._failed_chats
+            if not write_now:
+                self._pending_chats[node_id] = messages
+                self._schedule_flush()
+        
+        success = True
+        if write_now:
+            with self._flush_lock:
+                with self._pending_lock:
+                    # Older messages queued again by a failed flush
+                    self._pending_chats.pop(node_id, None)
+                success = self.db.save_chat_messages(node_id, messages)
+                if success:
+                    with self._pending_lock:
+                        self._failed_chats.discard(node_id)
+        
+        self._invalidate_cache(f"chat_{node_id}")
+        self._invalidate_cache("tree")
+        self._invalidate_cache("recent")
+        self._invalidate_cache("search")
         return success
     
+    def _schedule_flush(self):
+        """(Re)start the flush timer (caller holds _pending_lock)."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_timer = threading.Timer(self.chat_save_delay, self.flush_chats)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+    
+    def flush_chats(self) -> bool:
+        """Write all queued chat saves in one transaction.
+        
+        Returns False if any chat wasn't saved. If the transaction fails the
+        batch is queued again (newer saves of a chat take precedence) and
+        retried; chats whose node no longer exists are dropped. Either way
+        the chat's next save_chat reports its own result.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                pending, self._pending_chats = self._pending_chats, {}
+            if not pending:
+                return True
+            
+            unknown = self.db.save_chat_messages_many(pending)
+            with self._pending_lock:
+                if unknown is None:
+                    for node_id, messages in pending.items():
+                        self._pending_chats.setdefault(node_id, messages)
+                    self._failed_chats.update(pending)
+                    self._schedule_flush()
+                    return False
+                self._failed_chats.difference_update(pending)
+                self._failed_chats.update(unknown)
+            return not unknown
+    
     def get_chat(self, node_id: str) -> Optional[Dict]:
         """Get a complete chat with messages."""
-        return self._cached_call("chat", self._get_chat_uncached, node_id)
+        return self._cached_call("chat", self._get_chat_uncached, node_id,
+                                 tags=(f"chat_{node_id}", f"node_{node_id}"))
     
     def _get_chat_uncached(self, node_id: str) -> Optional[Dict]:
         """Internal method to get chat without caching."""
@@ -175,17 +352,25 @@ class DataService:
         
         return node
 
+    def get_chat_messages(self, node_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Get a chat's messages (only the last ``limit`` if given) with caching."""
+        return self._cached_call("chat_messages", self.db.get_chat_messages, node_id, limit,
+                                 tags=(f"chat_{node_id}", f"node_{node_id}"))
+
     def touch_chat(self, node_id: str) -> bool:
         """Mark a chat as recently used and invalidate caches."""
+        self.flush_chats()
         success = self.db.touch_chat(node_id)
         if success:
             self._invalidate_cache("tree")
+            self._invalidate_cache("recent")
             self._invalidate_cache(f"chat_{node_id}")
         return success
     
-    def search_content(self, query: str, content_type: str = 'all') -> List[Dict]:
-        """Search content with caching."""
-        return self._cached_call("search", self.db.search_content, query, content_type)
+    def search_content(self, query: str, content_type: str = 'all',
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Search content with caching (optionally one page of results)."""
+        return self._cached_call("search", self.db.search_content, query, content_type, limit, offset)
     
     def get_recent_items(self, limit: int = 10) -> List[Dict]:
         """Get recently updated items with caching."""
@@ -198,18 +383,22 @@ class DataService:
         if cached_stats:
             return cached_stats
         
-        tree = self.get_tree()
-        flat_nodes = self._flatten_tree(tree)
+        generation = self._cache_generation
+        tree = self._get_tree_shared()
+        
+        # Count every type in a single walk
+        type_counts = Counter(node['type'] for node in self._iter_tree(tree))
         
         stats = {
-            'total_nodes': len(flat_nodes),
-            'notes_count': len([n for n in flat_nodes if n['type'] == 'note']),
-            'chats_count': len([n for n in flat_nodes if n['type'] == 'chat']),
-            'folders_count': len([n for n in flat_nodes if n['type'] == 'folder']),
+            'total_nodes': sum(type_counts.values()),
+            'notes_count': type_counts['note'],
+            'chats_count': type_counts['chat'],
+            'folders_count': type_counts['folder'],
             'recent_activity': self.get_recent_items(5)
         }
         
-        self._set_cache(cache_key, stats)
+        # Derived from the tree and recent items, so drop it when either changes
+        self._set_cache(cache_key, stats, ("stats", "tree", "recent"), generation=generation)
         return stats
     
     def export_data(self) -> Dict[str, Any]:
@@ -224,26 +413,15 @@ class DataService:
         """Import data from backup."""
         try:
             # Clear existing data
+            self.flush_chats()
             self._invalidate_cache()
             
             if 'tree' in data:
-                # Process tree data
-                tree = data['tree']
-                for node in self._flatten_tree(tree):
-                    self.create_node(
-                        node['id'],
-                        node['name'],
-                        node['type'],
-                        node.get('parent_id'),
-                        customization=node.get('customization')
-                    )
-                    
-                    # Save content based on type
-                    if node['type'] == 'note' and 'content' in node:
-                        self.db.save_note_content(node['id'], node['content'])
-                    elif node['type'] == 'chat' and 'content' in node:
-                        messages = node['content'].get('messages', [])
-                        self.db.save_chat_messages(node['id'], messages)
+                # Insert all nodes and content in one batched transaction
+                # (walked parents-first) instead of one commit per row
+                success = self.db.import_nodes(self._iter_tree(data['tree']))
+                self._invalidate_cache()
+                return success
             
             return True
         except Exception as e:
@@ -253,6 +431,7 @@ class DataService:
     def migrate_from_json_files(self, tree_file: str, chats_file: str) -> bool:
         """Migrate from old JSON file format."""
         try:
+            self.flush_chats()
             success = self.db.migrate_from_json(tree_file, chats_file)
             if success:
                 self._invalidate_cache()  # Clear cache after migration
@@ -274,7 +453,7 @@ class DataService:
                 'database_connected': True,
                 'cache_working': cache_working,
                 'cache_entries': len(self._cache),
-                'total_nodes': len(self._flatten_tree(test_tree)),
+                'total_nodes': sum(1 for _ in self._iter_tree(test_tree)),
                 'status': 'healthy'
             }
         except Exception as e:
@@ -297,8 +476,8 @@ class DataService:
     # =========================
     # Tag System - Service APIs
     # =========================
-    def list_tags(self, q: Optional[str] = None, limit: int = 50, include_usage: bool = False, parent_id: Optional[str] = None) -> List[Dict]:
-        return self.db.list_tags(q, limit, include_usage, parent_id)
+    def list_tags(self, q: Optional[str] = None, limit: int = 50, include_usage: bool = False, parent_id: Optional[str] = None, include_aliases: bool = True) -> List[Dict]:
+        return self.db.list_tags(q, limit, include_usage, parent_id, include_aliases)
 
     def create_tag(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         tag = self.db.create_tag(payload)
@@ -1,47 +1,333 @@
+import atexit
 import sqlite3
 import json
 import os
+import queue
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain, groupby
+from operator import itemgetter
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
 import logging
 import re
 
+try:
+    # Optional: faster JSON encoding/decoding for stored notes, chats and settings
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    _ORJSON_AVAILABLE = False
+
+def _dumps(obj: Any) -> str:
+    """Serialize to a JSON string, preferring orjson when installed."""
+    if _ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode('utf-8')
+    # Same compact, non-escaped form orjson writes
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+def _loads(data: str) -> Any:
+    """Parse a JSON string, preferring orjson when installed."""
+    if _ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+try:
+    # Optional: zstd compression for large note content
+    import zstandard
+    _ZSTD_AVAILABLE = True
+except ImportError:
+    _ZSTD_AVAILABLE = False
+
+# Note content JSON at least this long is stored zstd-compressed in
+# notes.content_blob (with notes.content left empty); smaller notes stay TEXT
+_COMPRESS_MIN_CHARS = 1024
+
+def _encode_note_content(content: Any) -> Tuple[str, Optional[bytes]]:
+    """Return the (content, content_blob) column values for note content."""
+    content_json = _dumps(content)
+    if _ZSTD_AVAILABLE and len(content_json) >= _COMPRESS_MIN_CHARS:
+        return '', zstandard.ZstdCompressor(level=3).compress(content_json.encode('utf-8'))
+    return content_json, None
+
+def _decompress_note(content_blob: bytes) -> bytes:
+    """Decompress a note's content_blob, failing clearly without zstandard."""
+    if not _ZSTD_AVAILABLE:
+        message = "Note content is zstd-compressed but the zstandard package is not installed"
+        # Also logged, since inside note_text() SQLite reports only that the
+        # function raised
+        logging.error(message)
+        raise RuntimeError(message)
+    return zstandard.ZstdDecompressor().decompress(content_blob)
+
+def _note_text(content: str, content_blob: Optional[bytes]) -> str:
+    """Return the note content JSON text from its (content, content_blob) columns."""
+    if content_blob is not None:
+        return _decompress_note(content_blob).decode('utf-8')
+    return content
+
+def _decode_note_content(content: str, content_blob: Optional[bytes]) -> Any:
+    """Parse note content from its (content, content_blob) columns."""
+    if content_blob is not None:
+        return _loads(_decompress_note(content_blob))
+    return _loads(content)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# SQLite's lower() only folds ASCII; tag name matching must agree with it
+# (and with the unique index on lower(name))
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+# Characters that need a backslash escape to match literally in LIKE
+_LIKE_SPECIAL_RE = re.compile(r"[\\%_]")
+
+def _like_contains(s: str) -> str:
+    """LIKE pattern (for ESCAPE '\\') matching s literally anywhere in a value."""
+    return '%' + _LIKE_SPECIAL_RE.sub(r'\\\g<0>', s) + '%'
+
+_DASH_RUN_RE = re.compile(r"-+")
+
 def _normalize_name(s: str) -> str:
     if s is None:
         return ''
     # Normalize whitespace and case for uniqueness
     s = s.strip()
-    s = re.sub(r"\s+", " ", s)
+    s = _WHITESPACE_RE.sub(" ", s)
     return s
 
+class _SlugTable(dict):
+    """str.translate table for slugs: keeps a-z, 0-9 and '-', maps whitespace
+    and '_' to '-', drops everything else. Other code points are classified
+    on first sight and remembered."""
+    
+    def __missing__(self, code: int) -> Optional[str]:
+        value = '-' if chr(code).isspace() else None
+        self[code] = value
+        return value
+
+_SLUG_TABLE = _SlugTable({ord(c): c for c in 'abcdefghijklmnopqrstuvwxyz0123456789-'})
+_SLUG_TABLE[ord('_')] = '-'
+
+@lru_cache(maxsize=4096)
 def _slugify(s: str) -> str:
-    s = (s or '').strip().lower()
-    s = re.sub(r"[\s_]+", "-", s)
-    s = re.sub(r"[^a-z0-9\-]", "", s)
-    s = re.sub(r"-+", "-", s).strip('-')
+    s = (s or '').strip().lower().translate(_SLUG_TABLE)
+    s = _DASH_RUN_RE.sub("-", s).strip('-')
     return s or 'tag'
 
+# Sibling order for the tree, applied in SQL: rows are grouped by parent
+# (roots first); within a parent, folders come first by sort_order, then chats
+# most recently updated first, then other nodes by sort_order; ties by name.
+# Timestamps are all CURRENT_TIMESTAMP text, which sorts chronologically as
+# is, so chats compare updated_at directly instead of converting each one
+_TREE_ORDER_BY = '''
+    n.parent_id NULLS FIRST,
+    CASE n.type WHEN 'folder' THEN 0 WHEN 'chat' THEN 1 ELSE 2 END,
+    CASE WHEN n.type = 'chat' THEN n.updated_at END DESC,
+    CASE WHEN n.type <> 'chat' THEN COALESCE(n.sort_order, 0) END,
+    n.name
+'''
+
+# Tree queries are built once here rather than formatted on every call
+_SQL_GET_TREE = f'''
+    SELECT n.id, n.name, n.type, n.parent_id, n.sort_order, n.created_at,
+           n.updated_at, n.collapsed, n.customization
+    FROM nodes n
+    ORDER BY {_TREE_ORDER_BY}
+'''
+
+_SQL_GET_TREE_WITH_CONTENT = f'''
+    SELECT n.id, n.name, n.type, n.parent_id, n.sort_order, n.created_at,
+           n.updated_at, n.collapsed, n.customization,
+           notes.content AS note_content, notes.content_blob AS note_blob,
+           chats.messages AS chat_messages,
+           notes.version AS note_version, chats.id IS NOT NULL AS has_chat
+    FROM nodes n
+    LEFT JOIN notes ON notes.id = n.id
+    LEFT JOIN chats ON chats.id = n.id
+    ORDER BY {_TREE_ORDER_BY}
+'''
+
+# Node columns plus what exists behind each node, without loading content
+_SQL_GET_TREE_WITH_META = f'''
+    SELECT n.id, n.name, n.type, n.parent_id, n.sort_order, n.created_at,
+           n.updated_at, n.collapsed, n.customization,
+           notes.version AS note_version, chats.id IS NOT NULL AS has_chat
+    FROM nodes n
+    LEFT JOIN notes ON notes.id = n.id
+    LEFT JOIN chats ON chats.id = n.id
+    ORDER BY {_TREE_ORDER_BY}
+'''
+
+# Each node rendered as a JSON object by SQLite itself, with the same keys as
+# get_tree(include_content=True) minus children (get_tree_json nests those)
+_SQL_GET_TREE_JSON = f'''
+    SELECT n.id, n.parent_id,
+           CASE
+               WHEN n.type = 'note' AND n.note_content IS NOT NULL
+                   THEN json_set(n.obj, '$.content', json(note_text(n.note_content, n.note_blob)))
+               WHEN n.type = 'chat'
+                   THEN json_set(n.obj, '$.content',
+                                 json_object('messages', json(COALESCE(n.chat_messages, '[]'))))
+               ELSE n.obj
+           END
+    FROM (
+        SELECT n.id, n.name, n.type, n.parent_id, n.sort_order, n.updated_at,
+               json_object(
+                   'id', n.id, 'name', n.name, 'type', n.type, 'parent_id', n.parent_id,
+                   'sort_order', n.sort_order, 'created_at', n.created_at,
+                   'updated_at', n.updated_at, 'collapsed', n.collapsed,
+                   'customization', CASE WHEN n.customization <> '' THEN json(n.customization)
+                                         ELSE n.customization END
+               ) AS obj,
+               notes.content AS note_content, notes.content_blob AS note_blob,
+               chats.messages AS chat_messages
+        FROM nodes n
+        LEFT JOIN notes ON notes.id = n.id
+        LEFT JOIN chats ON chats.id = n.id
+    ) AS n
+    ORDER BY {_TREE_ORDER_BY}
+'''
+
+# The notes_fts triggers are plain SQL and index uncompressed content only;
+# compressed notes are indexed by the writer (OR REPLACE also covers an upsert
+# that left the row unchanged)
+_SQL_INDEX_COMPRESSED_NOTES = '''
+    INSERT OR REPLACE INTO notes_fts(rowid, text)
+    SELECT rowid, note_text(content, content_blob) FROM notes
+    WHERE id = ? AND content_blob IS NOT NULL
+'''
+
+# Tag filters arrive as JSON arrays (one parameter each, empty when unused),
+# so every call runs the same statement text and reuses one prepared
+# statement instead of a new IN (?, ?, ...) shape per list length
+_SQL_SEARCH_NOTES_BY_TAGS = '''
+    SELECT n.id FROM notes n
+    WHERE (?1 = '[]' OR EXISTS (
+              SELECT 1 FROM note_tags nt
+              WHERE nt.note_id = n.id AND nt.tag_id IN (SELECT value FROM json_each(?1))))
+      AND NOT EXISTS (
+              SELECT 1 FROM json_each(?2) AS wanted
+              WHERE NOT EXISTS (SELECT 1 FROM note_tags nt
+                                WHERE nt.note_id = n.id AND nt.tag_id = wanted.value))
+      AND NOT EXISTS (
+              SELECT 1 FROM note_tags nt
+              WHERE nt.note_id = n.id AND nt.tag_id IN (SELECT value FROM json_each(?3)))
+    ORDER BY n.updated_at DESC LIMIT ?4
+'''
+
+# Tag columns returned by the tag APIs, named rather than SELECT * so only
+# these cross into Python; aliases last so list_tags can leave them out
+_TAG_COLUMNS_NO_ALIASES = 'id, name, slug, color, icon, description, parent_id, last_used_at, created_at, updated_at'
+_TAG_COLUMNS = _TAG_COLUMNS_NO_ALIASES + ', aliases'
+_SQL_TAG_BY_ID = f'SELECT {_TAG_COLUMNS} FROM tags WHERE id = ?'
+
+# Node columns update_node may set, in the order they appear in its SQL
+_NODE_UPDATE_FIELDS = ('name', 'type', 'parent_id', 'collapsed', 'customization', 'sort_order')
+
+@lru_cache(maxsize=None)
+def _update_node_sql(fields: Tuple[str, ...]) -> str:
+    """Build (once per field combination) the UPDATE statement for update_node.
+    
+    Any field but collapsed (UI state) counts as an edit and bumps updated_at.
+    """
+    assignments = [f'{field} = ?' for field in fields]
+    if any(field != 'collapsed' for field in fields):
+        assignments.append('updated_at = CURRENT_TIMESTAMP')
+    return f"UPDATE nodes SET {', '.join(assignments)} WHERE id = ?"
+
 class DatabaseManager:
-    def __init__(self, db_path: str = "instance/notetaker.db"):
+    def __init__(self, db_path: str = "instance/notetaker.db", pool_size: int = 8):
         """Initialize the database manager with SQLite database."""
         self.db_path = db_path
+        # Idle connections are kept open between calls so each call doesn't pay
+        # for sqlite3.connect, schema parsing and a cold page cache
+        self._pool: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+        # Set by init_database when this SQLite build has FTS5 with trigrams
+        self._fts_enabled = False
+        # Lowercased tag name -> id and alias -> id, built on first lookup and
+        # dropped whenever tags change (see _get_tag_by_name_or_alias)
+        self._tag_lookup: Optional[Tuple[Dict[str, str], Dict[str, str]]] = None
+        self._tag_lookup_lock = threading.Lock()
         self.ensure_database_exists()
         self.init_database()
+        # Close idle connections at shutdown so the last one out checkpoints
+        # the WAL back into the database file
+        atexit.register(self.close)
     
     def ensure_database_exists(self):
         """Ensure the database directory exists."""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
     
-    def get_connection(self) -> sqlite3.Connection:
-        """Get a database connection with proper configuration."""
-        conn = sqlite3.connect(self.db_path)
+    def _create_connection(self) -> sqlite3.Connection:
+        """Open a new database connection with proper configuration."""
+        # Pooled connections are handed to whichever request thread borrows
+        # them, and are long-lived, so a larger statement cache lets hot
+        # queries skip re-preparing (the default holds only 128)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
         conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
         conn.execute("PRAGMA foreign_keys = ON")  # Enable foreign key constraints
+        # NORMAL sync is safe under WAL (set once in init_database) and skips
+        # an fsync per commit; unlike the journal mode it is per connection
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        # Page cache is per connection (16 MB each across the pool); the
+        # memory map is shared through the OS page cache
+        conn.execute("PRAGMA cache_size = -16000")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        # Lets SQL (e.g. search LIKE) see compressed note content as text
+        conn.create_function("note_text", 2, _note_text, deterministic=True)
         return conn
     
+    @contextmanager
+    def get_connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled database connection.
+        
+        Commits on success and rolls back on error (like using the connection
+        itself as a context manager), then returns the connection to the pool.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._create_connection()
+        try:
+            with conn:
+                yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def close(self):
+        """Close all idle pooled connections.
+        
+        The first one runs PRAGMA optimize before closing, refreshing the
+        statistics of tables whose queries since startup would benefit.
+        """
+        optimized = False
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            if not optimized:
+                try:
+                    conn.execute("PRAGMA optimize")
+                except sqlite3.Error as e:
+                    logging.warning(f"PRAGMA optimize failed: {e}")
+                optimized = True
+            conn.close()
+    
     def init_database(self):
         """Initialize the database with required tables."""
         with self.get_connection() as conn:
+            # WAL lets readers run alongside a writer; the mode is stored in
+            # the database file, so it only needs setting once
+            conn.execute("PRAGMA journal_mode = WAL")
+            
+            # sqlite3 doesn't open a transaction for DDL, so without this each
+            # statement below would commit (and sync) on its own
+            conn.execute("BEGIN IMMEDIATE")
+            
             # Create nodes table for tree structure
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS nodes (
@@ -64,6 +350,7 @@ class DatabaseManager:
                     id TEXT PRIMARY KEY,
                     node_id TEXT NOT NULL,
                     content TEXT NOT NULL,
+                    content_blob BLOB,
                     version INTEGER DEFAULT 1,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -83,35 +370,34 @@ class DatabaseManager:
                 )
             ''')
             
+            # Add columns introduced after the initial schema
+            note_columns = {row['name'] for row in conn.execute("PRAGMA table_info(notes)")}
+            if 'content_blob' not in note_columns:
+                conn.execute('ALTER TABLE notes ADD COLUMN content_blob BLOB')
+            
             # Create indexes for better performance
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_nodes_parent_id ON nodes(parent_id)')
+            # (parent_id, sort_order) serves sibling lookups, MAX(sort_order) per
+            # parent and reorder range scans; it also covers parent_id alone
+            conn.execute('DROP INDEX IF EXISTS idx_nodes_parent_id')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_nodes_parent_sort ON nodes(parent_id, sort_order)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_nodes_type ON nodes(type)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_notes_node_id ON notes(node_id)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_chats_node_id ON chats(node_id)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_nodes_updated_at ON nodes(updated_at)')
             
-            # Create triggers for auto-updating timestamps
-            conn.execute('''
-                CREATE TRIGGER IF NOT EXISTS update_nodes_timestamp 
-                AFTER UPDATE ON nodes
-                BEGIN
-                    UPDATE nodes SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
-                END
-            ''')
+            # Timestamps are set by the UPDATE statements themselves (a real
+            # edit of a node, i.e. not just collapsed, bumps it); the old
+            # triggers re-updated every changed row a second time
+            conn.execute('DROP TRIGGER IF EXISTS update_nodes_timestamp')
+            conn.execute('DROP TRIGGER IF EXISTS update_nodes_content_timestamp')
+            conn.execute('DROP TRIGGER IF EXISTS update_notes_timestamp')
+            conn.execute('DROP TRIGGER IF EXISTS update_chats_timestamp')
             
+            # Saving a chat bumps its node, which orders chats in the tree
             conn.execute('''
-                CREATE TRIGGER IF NOT EXISTS update_notes_timestamp 
-                AFTER UPDATE ON notes
+                CREATE TRIGGER IF NOT EXISTS update_nodes_on_chat_update
+                AFTER UPDATE OF messages ON chats
                 BEGIN
-                    UPDATE notes SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
-                END
-            ''')
-            
-            conn.execute('''
-                CREATE TRIGGER IF NOT EXISTS update_chats_timestamp 
-                AFTER UPDATE ON chats
-                BEGIN
-                    UPDATE chats SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
                     UPDATE nodes SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.node_id;
                 END
             ''')
@@ -157,8 +443,14 @@ class DatabaseManager:
             conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_tags_lower_name ON tags(lower(name))')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_tags_slug ON tags(slug)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_tags_parent_id ON tags(parent_id)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_note_tags_tag_id ON note_tags(tag_id)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_note_tags_note_id ON note_tags(note_id)')
+            # (tag_id, note_id) covers tag -> notes lookups without touching the
+            # table; note -> tags lookups already use the primary key index, so
+            # the old single-column indexes are dropped
+            conn.execute('DROP INDEX IF EXISTS idx_note_tags_tag_id')
+            conn.execute('DROP INDEX IF EXISTS idx_note_tags_note_id')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_note_tags_tag_note ON note_tags(tag_id, note_id)')
+            # Tag searches and dashboards list notes by most recent update
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_notes_updated_at ON notes(updated_at)')
 
             # Triggers for timestamps on tags
             conn.execute('''
@@ -169,25 +461,170 @@ class DatabaseManager:
                 END
             ''')
             
+            self._init_tag_aliases(conn)
+            
+            # Full-text indexes for search_content; optional, since FTS5 and the
+            # trigram tokenizer depend on how SQLite was built
+            try:
+                self._init_fts(conn)
+                self._fts_enabled = True
+            except sqlite3.OperationalError as e:
+                logging.warning(f"Full-text search unavailable, falling back to LIKE scans: {e}")
+            
+            # Give the planner table statistics: ANALYZE whatever lacks or has
+            # outdated stats (0x10002 also checks tables not yet queried on
+            # this connection), sampling at most ~400 rows per index so
+            # startup stays fast on large databases
+            conn.execute("PRAGMA analysis_limit = 400")
+            conn.execute("PRAGMA optimize = 0x10002")
+            
             conn.commit()
     
+    def _init_tag_aliases(self, conn: sqlite3.Connection):
+        """Create the tag_aliases index over the tags.aliases JSON arrays.
+        
+        tags.aliases stays the stored form the API reads and writes; triggers
+        mirror it into one row per lowercased alias, so alias lookups and
+        searches are indexed instead of unpacking every tag's JSON. When two
+        tags share an alias the first one keeps it, as before.
+        """
+        existing = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tag_aliases'"
+        ).fetchone()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tag_aliases (
+                alias_lower TEXT PRIMARY KEY,
+                tag_id TEXT NOT NULL,
+                FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tag_aliases_tag_id ON tag_aliases(tag_id)')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS tag_aliases_insert AFTER INSERT ON tags
+            BEGIN
+                INSERT OR IGNORE INTO tag_aliases (alias_lower, tag_id)
+                SELECT lower(value), NEW.id
+                FROM json_each(CASE WHEN json_valid(NEW.aliases) THEN NEW.aliases ELSE '[]' END)
+                WHERE type = 'text';
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS tag_aliases_update AFTER UPDATE OF aliases ON tags
+            BEGIN
+                DELETE FROM tag_aliases WHERE tag_id = OLD.id;
+                INSERT OR IGNORE INTO tag_aliases (alias_lower, tag_id)
+                SELECT lower(value), NEW.id
+                FROM json_each(CASE WHEN json_valid(NEW.aliases) THEN NEW.aliases ELSE '[]' END)
+                WHERE type = 'text';
+            END
+        ''')
+        # Deleted tags drop their aliases through the foreign key cascade
+        
+        # Index aliases of tags that predate the table
+        if not existing:
+            conn.execute('''
+                INSERT OR IGNORE INTO tag_aliases (alias_lower, tag_id)
+                SELECT lower(json_each.value), tags.id
+                FROM tags, json_each(CASE WHEN json_valid(tags.aliases) THEN tags.aliases ELSE '[]' END)
+                WHERE json_each.type = 'text'
+            ''')
+    
+    def _init_fts(self, conn: sqlite3.Connection):
+        """Create the FTS5 indexes over note text and chat messages.
+        
+        Chats are an external-content table kept in sync by triggers, so the
+        text isn't stored twice. Notes may be stored compressed, so notes_fts
+        keeps its own copy of the text: the triggers (built-in SQL only, so
+        any SQLite client can write notes) index uncompressed content, and
+        the writers index compressed content (_SQL_INDEX_COMPRESSED_NOTES).
+        The trigram tokenizer keeps search_content's case-insensitive
+        substring LIKE semantics while using the index.
+        """
+        # The old notes index read compressed content through the note_text()
+        # view, which only this app's connections can evaluate
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_text'").fetchone():
+            conn.execute('DROP TRIGGER IF EXISTS notes_fts_insert')
+            conn.execute('DROP TRIGGER IF EXISTS notes_fts_delete')
+            conn.execute('DROP TRIGGER IF EXISTS notes_fts_update')
+            conn.execute('DROP TABLE IF EXISTS notes_fts')
+            conn.execute('DROP VIEW notes_text')
+        existing = {
+            row['name'] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE name IN ('notes_fts', 'chats_fts')"
+            )
+        }
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(text, tokenize='trigram')
+        ''')
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS chats_fts USING fts5(
+                messages, content='chats', content_rowid='rowid', tokenize='trigram'
+            )
+        ''')
+        
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes
+            WHEN NEW.content_blob IS NULL
+            BEGIN
+                INSERT INTO notes_fts(rowid, text) VALUES (NEW.rowid, NEW.content);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes
+            BEGIN
+                DELETE FROM notes_fts WHERE rowid = OLD.rowid;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF content, content_blob ON notes
+            BEGIN
+                DELETE FROM notes_fts WHERE rowid = OLD.rowid;
+                INSERT INTO notes_fts(rowid, text)
+                SELECT NEW.rowid, NEW.content WHERE NEW.content_blob IS NULL;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS chats_fts_insert AFTER INSERT ON chats
+            BEGIN
+                INSERT INTO chats_fts(rowid, messages) VALUES (NEW.rowid, NEW.messages);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS chats_fts_delete AFTER DELETE ON chats
+            BEGIN
+                INSERT INTO chats_fts(chats_fts, rowid, messages) VALUES ('delete', OLD.rowid, OLD.messages);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS chats_fts_update AFTER UPDATE OF messages ON chats
+            BEGIN
+                INSERT INTO chats_fts(chats_fts, rowid, messages) VALUES ('delete', OLD.rowid, OLD.messages);
+                INSERT INTO chats_fts(rowid, messages) VALUES (NEW.rowid, NEW.messages);
+            END
+        ''')
+        
+        # Index rows that predate the FTS tables
+        if 'notes_fts' not in existing:
+            conn.execute('''
+                INSERT INTO notes_fts(rowid, text)
+                SELECT rowid, note_text(content, content_blob) FROM notes
+            ''')
+        if 'chats_fts' not in existing:
+            conn.execute("INSERT INTO chats_fts(chats_fts) VALUES ('rebuild')")
+    
     def create_node(self, node_id: str, name: str, node_type: str, parent_id: Optional[str] = None, 
                    customization: Optional[Dict] = None) -> bool:
         """Create a new node in the tree structure."""
         try:
             with self.get_connection() as conn:
-                # Get the next sort order for this parent
-                cursor = conn.execute('''
-                    SELECT COALESCE(MAX(sort_order), 0) + 1 as next_order
-                    FROM nodes WHERE parent_id = ? OR (parent_id IS NULL AND ? IS NULL)
-                ''', (parent_id, parent_id))
-                next_order = cursor.fetchone()['next_order']
-                
-                customization_json = json.dumps(customization) if customization else None
+                customization_json = _dumps(customization) if customization else None
+                # The next sort order for this parent is computed inside the
+                # INSERT, so no other writer can take it in between
                 conn.execute('''
                     INSERT INTO nodes (id, name, type, parent_id, customization, sort_order)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (node_id, name, node_type, parent_id, customization_json, next_order))
+                    VALUES (?1, ?2, ?3, ?4, ?5,
+                            (SELECT COALESCE(MAX(sort_order), 0) + 1 FROM nodes WHERE parent_id IS ?4))
+                ''', (node_id, name, node_type, parent_id, customization_json))
                 conn.commit()
                 return True
         except sqlite3.Error as e:
@@ -206,152 +643,191 @@ class DatabaseManager:
                 if row:
                     node = dict(row)
                     if node['customization']:
-                        node['customization'] = json.loads(node['customization'])
+                        node['customization'] = _loads(node['customization'])
                     return node
                 return None
         except sqlite3.Error as e:
             logging.error(f"Error getting node: {e}")
             return None
     
-    def get_tree(self) -> List[Dict]:
-        """Get the complete tree structure."""
+    def get_tree(self, include_content: bool = False, include_meta: bool = False,
+                 raise_errors: bool = False) -> List[Dict]:
+        """Get the complete tree structure.
+        
+        Args:
+            include_content: Also attach each note's content and each chat's
+                messages as ``content``, joined in the same query.
+            include_meta: Also attach ``note_version`` (None without a note
+                row) and ``has_chat``, so callers can tell what exists behind
+                each node without a query per node.
+            raise_errors: Raise sqlite3.Error instead of logging it and
+                returning an empty tree (so a cache can skip a failed read).
+        """
         try:
             with self.get_connection() as conn:
-                cursor = conn.execute('''
-                    SELECT id, name, type, parent_id, sort_order, created_at, updated_at, collapsed, customization
-                    FROM nodes 
-                    ORDER BY 
-                        parent_id NULLS FIRST,
-                        CASE WHEN type = 'folder' THEN 0 ELSE 1 END,
-                        sort_order,
-                        name
-                ''')
+                # Plain tuples: no sqlite3.Row per node just to copy it into a dict
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                if include_content:
+                    cursor.execute(_SQL_GET_TREE_WITH_CONTENT)
+                elif include_meta:
+                    cursor.execute(_SQL_GET_TREE_WITH_META)
+                else:
+                    cursor.execute(_SQL_GET_TREE)
                 nodes = []
-                for row in cursor.fetchall():
-                    node = dict(row)
-                    if node['customization']:
-                        node['customization'] = json.loads(node['customization'])
+                for row in cursor:
+                    (node_id, name, node_type, parent_id, sort_order, created_at,
+                     updated_at, collapsed, customization) = row[:9]
+                    node = {
+                        'id': node_id,
+                        'name': name,
+                        'type': node_type,
+                        'parent_id': parent_id,
+                        'sort_order': sort_order,
+                        'created_at': created_at,
+                        'updated_at': updated_at,
+                        'collapsed': collapsed,
+                        'customization': _loads(customization) if customization else customization,
+                    }
+                    if include_content:
+                        note_content, note_blob, chat_messages = row[9:12]
+                        if node_type == 'note':
+                            if note_content is not None:
+                                node['content'] = _decode_note_content(note_content, note_blob)
+                        elif node_type == 'chat':
+                            node['content'] = {
+                                'messages': _loads(chat_messages) if chat_messages is not None else []
+                            }
+                    if include_meta:
+                        note_version, has_chat = row[-2:]
+                        node['note_version'] = note_version
+                        node['has_chat'] = bool(has_chat)
+                    # Set here rather than in a second pass over the nodes
+                    node['children'] = []
                     nodes.append(node)
                 
                 # Build tree structure
                 return self._build_tree_structure(nodes)
         except sqlite3.Error as e:
+            if raise_errors:
+                raise
             logging.error(f"Error getting tree: {e}")
             return []
     
+    def get_tree_json(self, raise_errors: bool = False) -> bytes:
+        """Get the complete tree, with content, as UTF-8 JSON bytes.
+        
+        Same document as serializing get_tree(include_content=True), but SQLite
+        renders every node's JSON and only the children arrays are stitched
+        together here, so no Python dicts are built for the tree. Errors are
+        handled as in get_tree (an empty array unless ``raise_errors``).
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                rows = cursor.execute(_SQL_GET_TREE_JSON).fetchall()
+        except sqlite3.Error as e:
+            if raise_errors:
+                raise
+            logging.error(f"Error getting tree JSON: {e}")
+            return b'[]'
+        
+        # Same nesting rules as _build_tree_structure: children arrive as one
+        # sorted run per parent, orphans go after the real roots
+        index = {row[0]: i for i, row in enumerate(rows)}
+        children: Dict[int, List[int]] = {}
+        roots: List[int] = []
+        orphans: List[int] = []
+        position = 0
+        for parent_id, siblings in groupby(rows, key=itemgetter(1)):
+            run = list(range(position, position + len(list(siblings))))
+            position += len(run)
+            if parent_id is None:
+                roots.extend(run)
+            elif parent_id in index:
+                children.setdefault(index[parent_id], []).extend(run)
+            else:
+                orphans.extend(run)
+        roots.extend(orphans)
+        
+        # Emit with an explicit stack: ints are nodes, strings are literals
+        parts = []
+        stack: List[Any] = [']']
+        def push(ids: List[int]):
+            for i, child in enumerate(reversed(ids)):
+                if i:
+                    stack.append(',')
+                stack.append(child)
+        push(roots)
+        parts.append('[')
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            obj = rows[item][2]
+            parts.append(obj[:-1] + ',"children":[')
+            stack.append(']}')
+            push(children.get(item, []))
+        return ''.join(parts).encode('utf-8')
+    
     def _build_tree_structure(self, nodes: List[Dict]) -> List[Dict]:
         """Build hierarchical tree structure from flat node list.
 
-        Initializes a children list for every node before linking, so ordering
-        of rows from the database cannot cause KeyError when attaching children.
-        Orphaned nodes (missing parent) are placed at root to avoid breakage.
+        Expects rows in tree order (see _TREE_ORDER_BY): each parent's children
+        arrive as one run, already sorted, so they are attached a run at a time
+        and need no sorting here. Every node must already have an empty
+        children list. Orphaned nodes (missing parent) are placed at root,
+        after the real roots, to avoid breakage.
         """
         node_map = {node['id']: node for node in nodes}
-        # Initialize children for all nodes first to avoid KeyError regardless of order
-        for node in nodes:
-            node['children'] = []
 
         root_nodes: List[Dict] = []
-        for node in nodes:
-            parent_id = node.get('parent_id')
+        orphans: List[Dict] = []
+        for parent_id, siblings in groupby(nodes, key=itemgetter('parent_id')):
             if parent_id is None:
-                root_nodes.append(node)
-            else:
-                parent = node_map.get(parent_id)
-                if parent is not None:
-                    parent.setdefault('children', []).append(node)
-                else:
-                    # If parent not found, treat as root to keep tree stable
-                    root_nodes.append(node)
-        
-        # Sort children within each parent
-        def sort_children(node):
-            if node['children']:
-                # Custom sorting: folders first, then chats by most recent modification, then others
-                def sort_key(x):
-                    if x['type'] == 'folder':
-                        return (0, x.get('sort_order') or 0, x.get('name', ''))
-                    elif x['type'] == 'chat':
-                        # For chats, sort by updated_at descending (most recent first)
-                        # Convert datetime string to negative timestamp for reverse sorting
-                        updated_at = x.get('updated_at', '1970-01-01 00:00:00')
-                        try:
-                            from datetime import datetime
-                            # Handle SQLite datetime format (YYYY-MM-DD HH:MM:SS)
-                            if updated_at and updated_at != '1970-01-01 00:00:00':
-                                # Remove any timezone info and parse as local time
-                                dt_str = updated_at.replace('Z', '').replace('+00:00', '')
-                                dt = datetime.fromisoformat(dt_str)
-                                return (1, -dt.timestamp(), x.get('name', ''))
-                            else:
-                                return (1, 0, x.get('name', ''))
-                        except Exception as e:
-                            print(f"Error parsing datetime '{updated_at}': {e}")
-                            return (1, 0, x.get('name', ''))
-                    else:
-                        # Other types (notes, etc.) sorted by sort_order then name
-                        return (2, x.get('sort_order') or 0, x.get('name', ''))
-                
-                node['children'].sort(key=sort_key)
-                for child in node['children']:
-                    sort_children(child)
-        
-        for root in root_nodes:
-            sort_children(root)
-        
-        # Sort root nodes with same logic
-        def root_sort_key(x):
-            if x['type'] == 'folder':
-                return (0, x.get('sort_order') or 0, x.get('name', ''))
-            elif x['type'] == 'chat':
-                # For chats, sort by updated_at descending (most recent first)
-                updated_at = x.get('updated_at', '1970-01-01 00:00:00')
-                try:
-                    from datetime import datetime
-                    # Handle SQLite datetime format (YYYY-MM-DD HH:MM:SS)
-                    if updated_at and updated_at != '1970-01-01 00:00:00':
-                        # Remove any timezone info and parse as local time
-                        dt_str = updated_at.replace('Z', '').replace('+00:00', '')
-                        dt = datetime.fromisoformat(dt_str)
-                        return (1, -dt.timestamp(), x.get('name', ''))
-                    else:
-                        return (1, 0, x.get('name', ''))
-                except Exception as e:
-                    print(f"Error parsing datetime '{updated_at}': {e}")
-                    return (1, 0, x.get('name', ''))
+                root_nodes.extend(siblings)
+                continue
+            parent = node_map.get(parent_id)
+            if parent is not None:
+                parent['children'].extend(siblings)
             else:
-                return (2, x.get('sort_order') or 0, x.get('name', ''))
-        
-        root_nodes.sort(key=root_sort_key)
+                # If parent not found, treat as root to keep tree stable
+                orphans.extend(siblings)
         
+        root_nodes.extend(orphans)
         return root_nodes
     
     def update_node(self, node_id: str, **kwargs) -> bool:
         """Update a node's properties."""
         try:
             with self.get_connection() as conn:
-                # Define allowed fields for nodes table
-                allowed_fields = {
-                    'name', 'type', 'parent_id', 'collapsed', 'customization', 'sort_order'
-                }
-                
-                # Build dynamic update query
+                # Build dynamic update query; fields are taken in a fixed order
+                # so the same set of fields always produces the same (cached)
+                # statement
                 update_fields = []
                 values = []
                 
-                logging.info(f"Updating node {node_id} with kwargs: {kwargs}")
+                # %-style arguments: these run on every autosave, and are only
+                # formatted when INFO is actually enabled
+                logging.info("Updating node %s with kwargs: %s", node_id, kwargs)
                 
-                for field, value in kwargs.items():
-                    if field not in allowed_fields:
+                for field in kwargs:
+                    if field not in _NODE_UPDATE_FIELDS:
                         logging.warning(f"Ignoring invalid field: {field}")
+                
+                for field in _NODE_UPDATE_FIELDS:
+                    if field not in kwargs:
                         continue
-                        
+                    value = kwargs[field]
+                    
                     if field == 'customization' and value is not None:
-                        value = json.dumps(value)
+                        value = _dumps(value)
                     elif field == 'collapsed' and value is not None:
                         value = 1 if value else 0  # Convert boolean to integer for SQLite
                     
-                    update_fields.append(f"{field} = ?")
+                    update_fields.append(field)
                     values.append(value)
                 
                 if not update_fields:
@@ -359,15 +835,15 @@ class DatabaseManager:
                     return True
                 
                 values.append(node_id)
-                query = f"UPDATE nodes SET {', '.join(update_fields)} WHERE id = ?"
+                query = _update_node_sql(tuple(update_fields))
                 
-                logging.info(f"Executing query: {query} with values: {values}")
+                logging.info("Executing query: %s with values: %s", query, values)
                 
                 cursor = conn.execute(query, values)
                 rows_affected = cursor.rowcount
                 conn.commit()
                 
-                logging.info(f"Update completed, rows affected: {rows_affected}")
+                logging.info("Update completed, rows affected: %s", rows_affected)
                 return rows_affected > 0
         except sqlite3.Error as e:
             logging.error(f"Error updating node: {e}")
@@ -377,8 +853,19 @@ class DatabaseManager:
         """Delete a node and all its children."""
         try:
             with self.get_connection() as conn:
-                # SQLite will handle cascading deletes
-                conn.execute("DELETE FROM nodes WHERE id = ?", (node_id,))
+                # Collect the whole subtree with one recursive CTE and delete it
+                # deepest-first, so each DELETE hits a leaf: FK cascades then only
+                # reach its note/chat rows instead of recursing once per tree level
+                # (which fails past SQLite's trigger depth limit on deep trees)
+                cursor = conn.execute('''
+                    WITH RECURSIVE subtree(id, depth) AS (
+                        SELECT ?, 0
+                        UNION ALL
+                        SELECT n.id, s.depth + 1 FROM nodes n JOIN subtree s ON n.parent_id = s.id
+                    )
+                    SELECT id FROM subtree ORDER BY depth DESC
+                ''', (node_id,))
+                conn.executemany("DELETE FROM nodes WHERE id = ?", cursor.fetchall())
                 conn.commit()
                 return True
         except sqlite3.Error as e:
@@ -389,24 +876,21 @@ class DatabaseManager:
         """Save or update note content."""
         try:
             with self.get_connection() as conn:
-                content_json = json.dumps(content)
-                
-                # Check if note already exists
-                cursor = conn.execute("SELECT id FROM notes WHERE node_id = ?", (node_id,))
-                existing = cursor.fetchone()
+                content_json, content_blob = _encode_note_content(content)
                 
-                if existing:
-                    # Update existing note
-                    conn.execute('''
-                        UPDATE notes SET content = ?, version = version + 1 
-                        WHERE node_id = ?
-                    ''', (content_json, node_id))
-                else:
-                    # Create new note
-                    conn.execute('''
-                        INSERT INTO notes (id, node_id, content)
-                        VALUES (?, ?, ?)
-                    ''', (node_id, node_id, content_json))
+                # Insert or update in one statement (a note's id is its node ID);
+                # an autosave of unchanged content writes nothing, so it keeps
+                # its version and timestamp and skips the FTS re-index
+                conn.execute('''
+                    INSERT INTO notes (id, node_id, content, content_blob)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        content = excluded.content, content_blob = excluded.content_blob, version = version + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE content IS NOT excluded.content OR content_blob IS NOT excluded.content_blob
+                ''', (node_id, node_id, content_json, content_blob))
+                if content_blob is not None and self._fts_enabled:
+                    conn.execute(_SQL_INDEX_COMPRESSED_NOTES, (node_id,))
                 
                 conn.commit()
                 return True
@@ -419,13 +903,13 @@ class DatabaseManager:
         try:
             with self.get_connection() as conn:
                 cursor = conn.execute('''
-                    SELECT content, version, created_at, updated_at
+                    SELECT content, content_blob, version, created_at, updated_at
                     FROM notes WHERE node_id = ?
                 ''', (node_id,))
                 row = cursor.fetchone()
                 if row:
                     return {
-                        'content': json.loads(row['content']),
+                        'content': _decode_note_content(row['content'], row['content_blob']),
                         'version': row['version'],
                         'created_at': row['created_at'],
                         'updated_at': row['updated_at']
@@ -439,23 +923,14 @@ class DatabaseManager:
         """Save or update chat messages."""
         try:
             with self.get_connection() as conn:
-                messages_json = json.dumps(messages)
+                messages_json = _dumps(messages)
                 
-                # Check if chat already exists
-                cursor = conn.execute("SELECT id FROM chats WHERE node_id = ?", (node_id,))
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing chat
-                    conn.execute('''
-                        UPDATE chats SET messages = ? WHERE node_id = ?
-                    ''', (messages_json, node_id))
-                else:
-                    # Create new chat
-                    conn.execute('''
-                        INSERT INTO chats (id, node_id, messages)
-                        VALUES (?, ?, ?)
-                    ''', (node_id, node_id, messages_json))
+                # Insert or update in one statement (a chat's id is its node ID)
+                conn.execute('''
+                    INSERT INTO chats (id, node_id, messages)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET messages = excluded.messages, updated_at = CURRENT_TIMESTAMP
+                ''', (node_id, node_id, messages_json))
                 
                 conn.commit()
                 return True
@@ -463,92 +938,150 @@ class DatabaseManager:
             logging.error(f"Error saving chat messages: {e}")
             return False
     
-    def get_chat_messages(self, node_id: str) -> List[Dict]:
-        """Get chat messages by node ID."""
+    def save_chat_messages_many(self, chats: Dict[str, List[Dict]]) -> Optional[List[str]]:
+        """Save messages for several chats (node ID -> messages) in one transaction.
+        
+        Returns:
+            The IDs of chats that were skipped because their node doesn't
+            exist (the rest are saved), or None if the transaction failed and
+            nothing was saved.
+        """
         try:
             with self.get_connection() as conn:
-                cursor = conn.execute('''
-                    SELECT messages FROM chats WHERE node_id = ?
-                ''', (node_id,))
+                existing = {
+                    row['id'] for row in conn.execute(
+                        'SELECT id FROM nodes WHERE id IN (SELECT value FROM json_each(?))',
+                        (_dumps(list(chats)),)
+                    )
+                }
+                unknown = [node_id for node_id in chats if node_id not in existing]
+                if unknown:
+                    logging.warning(f"Not saving messages for unknown chats: {unknown}")
+                conn.executemany('''
+                    INSERT INTO chats (id, node_id, messages)
+                    VALUES (?1, ?1, ?2)
+                    ON CONFLICT(id) DO UPDATE SET messages = excluded.messages, updated_at = CURRENT_TIMESTAMP
+                ''', [(node_id, _dumps(messages)) for node_id, messages in chats.items()
+                      if node_id in existing])
+                return unknown
+        except sqlite3.Error as e:
+            logging.error(f"Error saving chat messages: {e}")
+            return None
+    
+    def get_chat_messages(self, node_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Get chat messages by node ID.
+        
+        Args:
+            node_id: The chat's node ID.
+            limit: Only return the last ``limit`` messages. The tail is sliced
+                out by SQLite's JSON functions, so only those messages are
+                parsed in Python.
+        """
+        try:
+            with self.get_connection() as conn:
+                if limit is None:
+                    cursor = conn.execute('''
+                        SELECT messages FROM chats WHERE node_id = ?
+                    ''', (node_id,))
+                else:
+                    # json_each walks the array in order
+                    cursor = conn.execute('''
+                        SELECT json_group_array(json_each.value) AS messages
+                        FROM chats, json_each(chats.messages)
+                        WHERE chats.node_id = ?
+                        AND json_each.key >= json_array_length(chats.messages) - ?
+                    ''', (node_id, limit))
                 row = cursor.fetchone()
                 if row:
-                    return json.loads(row['messages'])
+                    return _loads(row['messages'])
                 return []
         except sqlite3.Error as e:
             logging.error(f"Error getting chat messages: {e}")
             return []
 
     def touch_chat(self, node_id: str) -> bool:
-        """Mark a chat as recently used by updating its timestamps.
+        """Mark a chat as recently used by updating its node timestamp.
 
-        This updates the chats.updated_at (if chat row exists) which, via trigger,
-        also updates nodes.updated_at. If the chat row does not exist yet, we fall
-        back to directly updating nodes.updated_at to move the chat up in listings.
+        Only nodes.updated_at (which orders chats in the tree and recent items)
+        is bumped. The chats row is left alone: any UPDATE of it rewrites the
+        whole messages record, and re-indexes it for search if messages is set.
         """
         try:
             with self.get_connection() as conn:
-                # Try to bump chats.updated_at via a no-op messages update
-                cursor = conn.execute('SELECT id FROM chats WHERE node_id = ?', (node_id,))
-                chat_exists = cursor.fetchone() is not None
-
-                if chat_exists:
-                    # Perform an update to trigger the timestamp trigger
-                    conn.execute('''
-                        UPDATE chats SET messages = messages WHERE node_id = ?
-                    ''', (node_id,))
-                else:
-                    # No chat row yet; directly bump the node timestamp
-                    conn.execute('''
-                        UPDATE nodes SET updated_at = CURRENT_TIMESTAMP WHERE id = ? AND type = 'chat'
-                    ''', (node_id,))
-
+                conn.execute('''
+                    UPDATE nodes SET updated_at = CURRENT_TIMESTAMP WHERE id = ? AND type = 'chat'
+                ''', (node_id,))
                 conn.commit()
                 return True
         except sqlite3.Error as e:
             logging.error(f"Error touching chat '{node_id}': {e}")
             return False
     
-    def search_content(self, query: str, content_type: str = 'all') -> List[Dict]:
-        """Search for content across notes and chats."""
+    def search_content(self, query: str, content_type: str = 'all',
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Search for content across notes and chats.
+        
+        Note hits come before chat hits, each most recently updated first.
+        ``limit``/``offset`` page through the combined results in SQL, so only
+        the returned page is decoded.
+        """
         try:
             with self.get_connection() as conn:
                 results = []
                 
+                # The query is matched literally as a case-insensitive
+                # substring: LIKE wildcards in it are escaped, and for FTS it
+                # is quoted as one phrase
+                pattern = _like_contains(query)
+                if self._fts_enabled and len(query) >= 3:
+                    # A trigram phrase MATCH is a substring search answered
+                    # from the index; shorter queries have no trigram to use
+                    content_arg = '"' + query.replace('"', '""') + '"'
+                    note_match = 'notes.rowid IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)'
+                    chat_match = 'chats.rowid IN (SELECT rowid FROM chats_fts WHERE chats_fts MATCH ?)'
+                else:
+                    content_arg = pattern
+                    note_match = "note_text(notes.content, notes.content_blob) LIKE ? ESCAPE '\\'"
+                    chat_match = "chats.messages LIKE ? ESCAPE '\\'"
+                
+                selects = []
                 if content_type in ['all', 'notes']:
                     # Search in notes
-                    cursor = conn.execute('''
-                        SELECT n.id, n.name, n.type, notes.content, notes.updated_at
+                    selects.append(f'''
+                        SELECT 'note' AS kind, n.id, n.name, n.type, notes.content, notes.content_blob,
+                               NULL AS messages, notes.updated_at
                         FROM nodes n
                         JOIN notes ON n.id = notes.node_id
-                        WHERE notes.content LIKE ? OR n.name LIKE ?
-                    ''', (f'%{query}%', f'%{query}%'))
-                    
-                    for row in cursor.fetchall():
-                        results.append({
-                            'id': row['id'],
-                            'name': row['name'],
-                            'type': row['type'],
-                            'content': json.loads(row['content']),
-                            'updated_at': row['updated_at']
-                        })
-                
+                        WHERE {note_match} OR n.name LIKE ? ESCAPE '\\'
+                    ''')
                 if content_type in ['all', 'chats']:
                     # Search in chats
-                    cursor = conn.execute('''
-                        SELECT n.id, n.name, n.type, chats.messages, chats.updated_at
+                    selects.append(f'''
+                        SELECT 'chat' AS kind, n.id, n.name, n.type, NULL, NULL,
+                               chats.messages, chats.updated_at
                         FROM nodes n
                         JOIN chats ON n.id = chats.node_id
-                        WHERE chats.messages LIKE ? OR n.name LIKE ?
-                    ''', (f'%{query}%', f'%{query}%'))
-                    
-                    for row in cursor.fetchall():
-                        results.append({
-                            'id': row['id'],
-                            'name': row['name'],
-                            'type': row['type'],
-                            'messages': json.loads(row['messages']),
-                            'updated_at': row['updated_at']
-                        })
+                        WHERE {chat_match} OR n.name LIKE ? ESCAPE '\\'
+                    ''')
+                if not selects:
+                    return results
+                
+                # A total order (id breaks ties) keeps pages from overlapping
+                cursor = conn.execute(
+                    'SELECT * FROM (' + ' UNION ALL '.join(selects) + ''')
+                    ORDER BY kind = 'chat', updated_at DESC, id
+                    LIMIT ? OFFSET ?''',
+                    (content_arg, pattern) * len(selects) + (-1 if limit is None else limit, offset)
+                )
+                
+                for row in cursor:
+                    result = {'id': row['id'], 'name': row['name'], 'type': row['type']}
+                    if row['kind'] == 'note':
+                        result['content'] = _decode_note_content(row['content'], row['content_blob'])
+                    else:
+                        result['messages'] = _loads(row['messages'])
+                    result['updated_at'] = row['updated_at']
+                    results.append(result)
                 
                 return results
         except sqlite3.Error as e:
@@ -574,57 +1107,65 @@ class DatabaseManager:
     # =========================
     # Tag System - Data Layer
     # =========================
+    def _load_tag_lookup(self, conn: sqlite3.Connection) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Return the (name -> id, alias -> id) maps, building them if needed.
+        
+        Keys are lowercased like SQLite's lower(); aliases come from the
+        tag_aliases index, so no JSON is parsed. Built under the lock so that a
+        build racing a tag change can't be stored after the invalidation.
+        """
+        with self._tag_lookup_lock:
+            if self._tag_lookup is None:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                by_name = dict(cursor.execute('SELECT lower(name), id FROM tags'))
+                by_alias = dict(cursor.execute('SELECT alias_lower, tag_id FROM tag_aliases'))
+                self._tag_lookup = (by_name, by_alias)
+            return self._tag_lookup
+    
+    def _invalidate_tag_lookup(self):
+        """Drop the tag name/alias maps; call after committing a tag change."""
+        with self._tag_lookup_lock:
+            self._tag_lookup = None
+    
     def _get_tag_by_name_or_alias(self, conn: sqlite3.Connection, name: str) -> Optional[Dict]:
         norm = _normalize_name(name)
         if not norm:
             return None
-        cur = conn.execute('SELECT * FROM tags WHERE lower(name) = lower(?)', (norm,))
-        row = cur.fetchone()
-        if row:
-            return dict(row)
-        # Search in aliases JSON (stored as simple JSON array of strings)
-        # SQLite json_each exists if JSON1 is enabled; fallback to LIKE search then verify in Python
-        try:
-            cur = conn.execute('''
-                SELECT t.* FROM tags t, json_each(t.aliases)
-                WHERE lower(json_each.value) = lower(?)
-            ''', (norm,))
-            row = cur.fetchone()
-            return dict(row) if row else None
-        except sqlite3.Error:
-            # Fallback: scan
-            cur = conn.execute('SELECT * FROM tags WHERE aliases IS NOT NULL')
-            for r in cur.fetchall():
-                try:
-                    aliases = json.loads(r['aliases']) if r['aliases'] else []
-                except Exception:
-                    aliases = []
-                if any(a.lower() == norm.lower() for a in aliases):
-                    return dict(r)
+        key = norm.translate(_ASCII_LOWER)
+        by_name, by_alias = self._load_tag_lookup(conn)
+        tag_id = by_name.get(key) or by_alias.get(key)
+        if tag_id is None:
             return None
+        row = conn.execute(_SQL_TAG_BY_ID, (tag_id,)).fetchone()
+        return dict(row) if row else None
 
     def _ensure_unique_slug(self, conn: sqlite3.Connection, base: str, current_id: Optional[str] = None) -> str:
         slug = _slugify(base)
-        candidate = slug or 'tag'
-        i = 1
-        while True:
-            if current_id:
-                cur = conn.execute('SELECT id FROM tags WHERE slug = ? AND id != ?', (candidate, current_id))
-            else:
-                cur = conn.execute('SELECT id FROM tags WHERE slug = ?', (candidate,))
-            if cur.fetchone() is None:
-                return candidate
-            i += 1
-            candidate = f"{slug}-{i}"
+        # One query instead of probing slug, slug-2, slug-3, ...: whether the
+        # slug itself is taken, and the highest numeric suffix in use (the
+        # GLOB prefix is a range scan on idx_tags_slug)
+        row = conn.execute('''
+            SELECT EXISTS (SELECT 1 FROM tags WHERE slug = ?1 AND id IS NOT ?3) AS taken,
+                   (SELECT MAX(CAST(substr(slug, ?4) AS INTEGER)) FROM tags
+                    WHERE slug GLOB ?2 AND id IS NOT ?3
+                      AND substr(slug, ?4) NOT GLOB '*[^0-9]*') AS max_suffix
+        ''', (slug, slug + '-[0-9]*', current_id, len(slug) + 2)).fetchone()
+        if not row['taken']:
+            return slug
+        return f"{slug}-{max(row['max_suffix'] or 1, 1) + 1}"
 
-    def list_tags(self, q: Optional[str] = None, limit: int = 50, include_usage: bool = False, parent_id: Optional[str] = None) -> List[Dict]:
+    def list_tags(self, q: Optional[str] = None, limit: int = 50, include_usage: bool = False, parent_id: Optional[str] = None, include_aliases: bool = True) -> List[Dict]:
         try:
             with self.get_connection() as conn:
                 params: List[Any] = []
                 where: List[str] = []
                 if q:
-                    params.extend([f"%{q}%", f"%{q}%"])
-                    where.append('(lower(name) LIKE lower(?) OR lower(COALESCE(aliases, "")) LIKE lower(?))')
+                    # LIKE already ignores ASCII case, like lower() did
+                    pattern = _like_contains(q)
+                    where.append('''(name LIKE ? ESCAPE '\\'
+                                     OR id IN (SELECT tag_id FROM tag_aliases WHERE alias_lower LIKE ? ESCAPE '\\'))''')
+                    params.extend([pattern, pattern])
                 if parent_id is None:
                     pass
                 elif parent_id == 'root':
@@ -632,23 +1173,26 @@ class DatabaseManager:
                 else:
                     where.append('parent_id = ?')
                     params.append(parent_id)
-                sql = 'SELECT * FROM tags'
+                sql = f'SELECT {_TAG_COLUMNS if include_aliases else _TAG_COLUMNS_NO_ALIASES} FROM tags'
                 if where:
                     sql += ' WHERE ' + ' AND '.join(where)
                 sql += ' ORDER BY name COLLATE NOCASE LIMIT ?'
                 params.append(limit)
                 cur = conn.execute(sql, params)
                 tags = [dict(row) for row in cur.fetchall()]
-                for t in tags:
-                    if t.get('aliases'):
-                        try:
-                            t['aliases'] = json.loads(t['aliases'])
-                        except Exception:
-                            t['aliases'] = []
+                if include_aliases:
+                    for t in tags:
+                        if t.get('aliases'):
+                            try:
+                                t['aliases'] = _loads(t['aliases'])
+                            except Exception:
+                                t['aliases'] = []
                 if include_usage and tags:
                     ids = [t['id'] for t in tags]
-                    qmarks = ','.join('?' for _ in ids)
-                    cur = conn.execute(f'SELECT tag_id, COUNT(*) as cnt FROM note_tags WHERE tag_id IN ({qmarks}) GROUP BY tag_id', ids)
+                    cur = conn.execute('''
+                        SELECT tag_id, COUNT(*) as cnt FROM note_tags
+                        WHERE tag_id IN (SELECT value FROM json_each(?)) GROUP BY tag_id
+                    ''', (_dumps(ids),))
                     usage = {row['tag_id']: row['cnt'] for row in cur.fetchall()}
                     for t in tags:
                         t['usage'] = usage.get(t['id'], 0)
@@ -666,16 +1210,20 @@ class DatabaseManager:
                 existing = self._get_tag_by_name_or_alias(conn, name)
                 if existing:
                     return existing
-                aliases = tag.get('aliases') or []
-                if isinstance(aliases, str):
-                    aliases = [aliases]
-                # Normalize aliases
-                aliases = [_normalize_name(a) for a in aliases if _normalize_name(a)]
-                # Ensure aliases don't conflict with existing names
-                for a in aliases:
-                    if self._get_tag_by_name_or_alias(conn, a):
-                        # Skip conflicting alias
-                        aliases = [x for x in aliases if x != a]
+                raw_aliases = tag.get('aliases') or []
+                if isinstance(raw_aliases, str):
+                    raw_aliases = [raw_aliases]
+                # Normalize each alias once, dedup case-insensitively (keeping
+                # the first spelling) and skip any that already name or alias
+                # another tag, all against the in-memory lookup maps
+                by_name, by_alias = self._load_tag_lookup(conn)
+                unique_aliases: Dict[str, str] = {}
+                for raw in raw_aliases:
+                    alias = _normalize_name(raw)
+                    key = alias.translate(_ASCII_LOWER)
+                    if alias and key not in by_name and key not in by_alias:
+                        unique_aliases.setdefault(key, alias)
+                aliases = list(unique_aliases.values())
                 tag_id = tag.get('id') or name  # default stable id if provided else name; caller may pass ULID
                 # Ensure slug
                 slug = self._ensure_unique_slug(conn, tag.get('slug') or name)
@@ -686,9 +1234,10 @@ class DatabaseManager:
                 conn.execute('''
                     INSERT INTO tags (id, name, slug, color, icon, description, parent_id, aliases)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (tag_id, name, slug, color, icon, description, parent_id, json.dumps(aliases) if aliases else None))
+                ''', (tag_id, name, slug, color, icon, description, parent_id, _dumps(aliases) if aliases else None))
                 conn.commit()
-                cur = conn.execute('SELECT * FROM tags WHERE id = ?', (tag_id,))
+                self._invalidate_tag_lookup()
+                cur = conn.execute(_SQL_TAG_BY_ID, (tag_id,))
                 row = cur.fetchone()
                 return dict(row) if row else None
         except sqlite3.Error as e:
@@ -698,7 +1247,7 @@ class DatabaseManager:
     def update_tag(self, tag_id: str, patch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
             with self.get_connection() as conn:
-                cur = conn.execute('SELECT * FROM tags WHERE id = ?', (tag_id,))
+                cur = conn.execute(_SQL_TAG_BY_ID, (tag_id,))
                 orig = cur.fetchone()
                 if not orig:
                     return None
@@ -736,13 +1285,14 @@ class DatabaseManager:
                         aliases = [aliases]
                     aliases = [_normalize_name(a) for a in aliases if _normalize_name(a)]
                     updates.append('aliases = ?')
-                    values.append(json.dumps(aliases) if aliases else None)
+                    values.append(_dumps(aliases) if aliases else None)
                 if not updates:
                     return dict(orig)
                 values.append(tag_id)
                 conn.execute(f'UPDATE tags SET {", ".join(updates)} WHERE id = ?', values)
                 conn.commit()
-                cur = conn.execute('SELECT * FROM tags WHERE id = ?', (tag_id,))
+                self._invalidate_tag_lookup()
+                cur = conn.execute(_SQL_TAG_BY_ID, (tag_id,))
                 return dict(cur.fetchone())
         except sqlite3.Error as e:
             logging.error(f"Error updating tag: {e}")
@@ -765,6 +1315,7 @@ class DatabaseManager:
                     conn.execute('DELETE FROM note_tags WHERE tag_id = ?', (tag_id,))
                 conn.execute('DELETE FROM tags WHERE id = ?', (tag_id,))
                 conn.commit()
+                self._invalidate_tag_lookup()
                 return { 'deleted': True }
         except sqlite3.Error as e:
             logging.error(f"Error deleting tag: {e}")
@@ -773,8 +1324,11 @@ class DatabaseManager:
     def merge_tags(self, source_ids: List[str], target_id: str) -> Dict[str, Any]:
         try:
             with self.get_connection() as conn:
+                # Write lock up front, as in move_node: the tags read below
+                # are rewritten from what was read
+                conn.execute("BEGIN IMMEDIATE")
                 # Ensure target exists
-                cur = conn.execute('SELECT * FROM tags WHERE id = ?', (target_id,))
+                cur = conn.execute('SELECT name, aliases FROM tags WHERE id = ?', (target_id,))
                 target = cur.fetchone()
                 if not target:
                     return { 'merged': False, 'error': 'target_not_found' }
@@ -793,31 +1347,40 @@ class DatabaseManager:
                     if r:
                         names.append(r['name'])
                         try:
-                            al = json.loads(r['aliases']) if r['aliases'] else []
+                            al = _loads(r['aliases']) if r['aliases'] else []
                         except Exception:
                             al = []
                         aliases.extend(al)
                 try:
-                    t_aliases = json.loads(target['aliases']) if target['aliases'] else []
+                    t_aliases = _loads(target['aliases']) if target['aliases'] else []
                 except Exception:
                     t_aliases = []
                 merged_aliases = list({ _normalize_name(a) for a in (t_aliases + aliases + names) if _normalize_name(a) and _normalize_name(a).lower() != target['name'].lower() })
-                conn.execute('UPDATE tags SET aliases = ? WHERE id = ?', (json.dumps(merged_aliases) if merged_aliases else None, target_id))
-                # Delete sources
+                # Delete sources first, so their aliases are free in
+                # tag_aliases when the target takes them over
                 if source_ids:
                     conn.execute(f'DELETE FROM tags WHERE id IN ({qmarks})', source_ids)
+                conn.execute('UPDATE tags SET aliases = ? WHERE id = ?', (_dumps(merged_aliases) if merged_aliases else None, target_id))
                 conn.commit()
+                self._invalidate_tag_lookup()
                 return { 'merged': True, 'target_id': target_id, 'sources_deleted': source_ids }
         except sqlite3.Error as e:
             logging.error(f"Error merging tags: {e}")
             return { 'merged': False, 'error': str(e) }
 
+    def _add_note_tags(self, conn: sqlite3.Connection, note_id: str, tag_ids: List[str]):
+        """Link tags to a note and mark them used: one statement each, not per tag."""
+        conn.executemany('INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)',
+                         [(note_id, tid) for tid in tag_ids])
+        conn.execute('''
+            UPDATE tags SET last_used_at = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', (_dumps(tag_ids),))
+
     def assign_tags_to_note(self, note_id: str, tag_ids: List[str]) -> bool:
         try:
             with self.get_connection() as conn:
-                for tid in tag_ids:
-                    conn.execute('INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)', (note_id, tid))
-                    conn.execute('UPDATE tags SET last_used_at = CURRENT_TIMESTAMP WHERE id = ?', (tid,))
+                self._add_note_tags(conn, note_id, tag_ids)
                 conn.commit()
                 return True
         except sqlite3.Error as e:
@@ -828,9 +1391,7 @@ class DatabaseManager:
         try:
             with self.get_connection() as conn:
                 conn.execute('DELETE FROM note_tags WHERE note_id = ?', (note_id,))
-                for tid in tag_ids:
-                    conn.execute('INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)', (note_id, tid))
-                    conn.execute('UPDATE tags SET last_used_at = CURRENT_TIMESTAMP WHERE id = ?', (tid,))
+                self._add_note_tags(conn, note_id, tag_ids)
                 conn.commit()
                 return True
         except sqlite3.Error as e:
@@ -841,7 +1402,9 @@ class DatabaseManager:
         try:
             with self.get_connection() as conn:
                 cur = conn.execute('''
-                    SELECT t.* FROM tags t
+                    SELECT t.id, t.name, t.slug, t.color, t.icon, t.description, t.parent_id,
+                           t.last_used_at, t.created_at, t.updated_at, t.aliases
+                    FROM tags t
                     JOIN note_tags nt ON nt.tag_id = t.id
                     WHERE nt.note_id = ?
                     ORDER BY t.name COLLATE NOCASE
@@ -850,7 +1413,7 @@ class DatabaseManager:
                 for t in tags:
                     if t.get('aliases'):
                         try:
-                            t['aliases'] = json.loads(t['aliases'])
+                            t['aliases'] = _loads(t['aliases'])
                         except Exception:
                             t['aliases'] = []
                 return tags
@@ -864,24 +1427,8 @@ class DatabaseManager:
         none_of = none_of or []
         try:
             with self.get_connection() as conn:
-                params: List[Any] = []
-                base = 'SELECT n.id FROM notes n'
-                where_clauses: List[str] = []
-                if any_of:
-                    qmarks = ','.join('?' for _ in any_of)
-                    base += f' WHERE EXISTS (SELECT 1 FROM note_tags nt1 WHERE nt1.note_id = n.id AND nt1.tag_id IN ({qmarks}))'
-                    params.extend(any_of)
-                if all_of:
-                    for i, tid in enumerate(all_of):
-                        base += f' AND EXISTS (SELECT 1 FROM note_tags ntA{i} WHERE ntA{i}.note_id = n.id AND ntA{i}.tag_id = ? )'
-                        params.append(tid)
-                if none_of:
-                    qmarks = ','.join('?' for _ in none_of)
-                    base += f' AND NOT EXISTS (SELECT 1 FROM note_tags ntN WHERE ntN.note_id = n.id AND ntN.tag_id IN ({qmarks}))'
-                    params.extend(none_of)
-                base += ' ORDER BY n.updated_at DESC LIMIT ?'
-                params.append(limit)
-                cur = conn.execute(base, params)
+                cur = conn.execute(_SQL_SEARCH_NOTES_BY_TAGS,
+                                   (_dumps(any_of), _dumps(all_of), _dumps(none_of), limit))
                 return [row['id'] for row in cur.fetchall()]
         except sqlite3.Error as e:
             logging.error(f"Error searching notes by tags: {e}")
@@ -890,7 +1437,7 @@ class DatabaseManager:
     def get_tag_dashboard(self, tag_id: str) -> Dict[str, Any]:
         try:
             with self.get_connection() as conn:
-                cur = conn.execute('SELECT * FROM tags WHERE id = ?', (tag_id,))
+                cur = conn.execute(_SQL_TAG_BY_ID, (tag_id,))
                 t = cur.fetchone()
                 if not t:
                     return {}
@@ -902,13 +1449,14 @@ class DatabaseManager:
                 pid = tag.get('parent_id')
                 siblings = []
                 if pid:
-                    cur = conn.execute('SELECT * FROM tags WHERE parent_id = ? AND id != ? ORDER BY name COLLATE NOCASE', (pid, tag_id))
+                    cur = conn.execute(f'SELECT {_TAG_COLUMNS} FROM tags WHERE parent_id = ? AND id != ? ORDER BY name COLLATE NOCASE', (pid, tag_id))
                     siblings = [dict(r) for r in cur.fetchall()]
-                cur = conn.execute('SELECT * FROM tags WHERE parent_id = ? ORDER BY name COLLATE NOCASE', (tag_id,))
+                cur = conn.execute(f'SELECT {_TAG_COLUMNS} FROM tags WHERE parent_id = ? ORDER BY name COLLATE NOCASE', (tag_id,))
                 children = [dict(r) for r in cur.fetchall()]
                 # recent notes
                 cur = conn.execute('''
-                    SELECT n.id, n.name, n.updated_at FROM notes n
+                    SELECT n.id, nodes.name, n.updated_at FROM notes n
+                    JOIN nodes ON nodes.id = n.node_id
                     JOIN note_tags nt ON nt.note_id = n.id
                     WHERE nt.tag_id = ? ORDER BY n.updated_at DESC LIMIT 50
                 ''', (tag_id,))
@@ -925,8 +1473,8 @@ class DatabaseManager:
                 co_ids = [r['tag_id'] for r in cur.fetchall()]
                 co_tags = []
                 if co_ids:
-                    qmarks = ','.join('?' for _ in co_ids)
-                    cur = conn.execute(f'SELECT * FROM tags WHERE id IN ({qmarks})', co_ids)
+                    cur = conn.execute(f'SELECT {_TAG_COLUMNS} FROM tags WHERE id IN (SELECT value FROM json_each(?))',
+                                       (_dumps(co_ids),))
                     co_tags = [dict(r) for r in cur.fetchall()]
                 return {
                     'tag': tag,
@@ -944,78 +1492,143 @@ class DatabaseManager:
         """Create a backup of the database."""
         try:
             with self.get_connection() as conn:
+                # Fold the WAL into the main file first so the copy reads one
+                # file, then copy every page in a single step
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
                 backup_conn = sqlite3.connect(backup_path)
-                conn.backup(backup_conn)
-                backup_conn.close()
+                try:
+                    conn.backup(backup_conn, pages=-1)
+                finally:
+                    backup_conn.close()
                 return True
         except sqlite3.Error as e:
             logging.error(f"Error creating backup: {e}")
             return False
     
+    def import_nodes(self, nodes: Iterable[Dict]) -> bool:
+        """Bulk-insert nodes and their note/chat content in one transaction.
+
+        Nodes must be ordered parents-first (e.g. a pre-order tree walk). Like
+        create_node, nodes whose ID already exists are skipped and nodes whose
+        parent doesn't exist are rejected (along with their descendants);
+        content is saved the same way as save_note_content/save_chat_messages.
+        """
+        try:
+            with self.get_connection() as conn:
+                known_ids = {row['id'] for row in conn.execute("SELECT id FROM nodes")}
+                next_order = {
+                    row['parent_id']: row['max_order'] + 1
+                    for row in conn.execute('''
+                        SELECT parent_id, COALESCE(MAX(sort_order), 0) AS max_order
+                        FROM nodes GROUP BY parent_id
+                    ''')
+                }
+
+                node_rows = []
+                note_rows = []
+                chat_rows = []
+                for node in nodes:
+                    node_id = node['id']
+                    parent_id = node.get('parent_id')
+                    if parent_id is not None and parent_id not in known_ids:
+                        continue
+                    if node_id not in known_ids:
+                        known_ids.add(node_id)
+                        sort_order = next_order.get(parent_id, 1)
+                        next_order[parent_id] = sort_order + 1
+                        customization = node.get('customization')
+                        node_rows.append((
+                            node_id, node['name'], node['type'], parent_id,
+                            _dumps(customization) if customization else None, sort_order
+                        ))
+
+                    if node['type'] == 'note' and 'content' in node:
+                        note_rows.append((node_id, node_id, *_encode_note_content(node['content'])))
+                    elif node['type'] == 'chat' and 'content' in node:
+                        chat_rows.append((node_id, node_id, _dumps(node['content'].get('messages', []))))
+
+                conn.executemany('''
+                    INSERT INTO nodes (id, name, type, parent_id, customization, sort_order)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', node_rows)
+                conn.executemany('''
+                    INSERT INTO notes (id, node_id, content, content_blob) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        content = excluded.content, content_blob = excluded.content_blob, version = version + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE content IS NOT excluded.content OR content_blob IS NOT excluded.content_blob
+                ''', note_rows)
+                if self._fts_enabled:
+                    conn.executemany(_SQL_INDEX_COMPRESSED_NOTES,
+                                     [(row[0],) for row in note_rows if row[3] is not None])
+                conn.executemany('''
+                    INSERT INTO chats (id, node_id, messages) VALUES (?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET messages = excluded.messages, updated_at = CURRENT_TIMESTAMP
+                ''', chat_rows)
+                logging.info(f"Imported {len(node_rows)} nodes, {len(note_rows)} notes, {len(chat_rows)} chats")
+                return True
+        except sqlite3.Error as e:
+            logging.error(f"Error importing nodes: {e}")
+            return False
+    
     def migrate_from_json(self, tree_file: str, chats_file: str) -> bool:
         """Migrate existing JSON data to the new database structure."""
         try:
-            # Load existing data
+            # Load existing data; read as bytes so orjson (when installed)
+            # parses the files directly, without decoding them to str first
             tree_data = []
             if os.path.exists(tree_file):
-                with open(tree_file, 'r') as f:
-                    tree_data = json.load(f)
+                with open(tree_file, 'rb') as f:
+                    tree_data = _loads(f.read())
             
             chats_data = []
             if os.path.exists(chats_file):
-                with open(chats_file, 'r') as f:
-                    chats_data = json.load(f)
-            
-            # First pass: Create all nodes without content
-            def create_nodes_only(node, parent_id=None):
-                # Create node
-                self.create_node(
-                    node['id'],
-                    node['name'],
-                    node['type'],
-                    parent_id,
-                    node.get('customization')
-                )
-                
-                # Recursively create children nodes
-                for child in node.get('children', []):
-                    create_nodes_only(child, node['id'])
-            
-            # Create tree structure first
-            for root_node in tree_data:
-                create_nodes_only(root_node)
-            
-            # Create chat nodes from chats data
-            for chat in chats_data:
-                if chat['type'] == 'chat':
-                    self.create_node(
-                        chat['id'],
-                        chat['name'],
-                        chat['type'],
-                        chat.get('parentId'),
-                        chat.get('customization')
-                    )
-            
-            # Second pass: Save content for existing nodes
-            def save_content(node):
-                # Save content based on type
-                if node['type'] == 'note' and 'content' in node and node['content']:
-                    self.save_note_content(node['id'], node['content'])
-                
-                # Recursively save content for children
-                for child in node.get('children', []):
-                    save_content(child)
+                with open(chats_file, 'rb') as f:
+                    chats_data = _loads(f.read())
             
-            # Save content for tree nodes
-            for root_node in tree_data:
-                save_content(root_node)
+            # Walk the tree parents-first, taking each parent from the nesting
+            # (the JSON nodes don't carry parent IDs); only note content is
+            # migrated from the tree. A subtree whose ID was already walked
+            # (repeated fragments in merged backups) is skipped whole.
+            def tree_nodes():
+                visited = set()
+                stack = [(node, None) for node in reversed(tree_data)]
+                while stack:
+                    node, parent_id = stack.pop()
+                    if node['id'] in visited:
+                        continue
+                    visited.add(node['id'])
+                    row = {
+                        'id': node['id'],
+                        'name': node['name'],
+                        'type': node['type'],
+                        'parent_id': parent_id,
+                        'customization': node.get('customization'),
+                    }
+                    if node['type'] == 'note' and node.get('content'):
+                        row['content'] = node['content']
+                    yield row
+                    stack.extend((child, node['id']) for child in reversed(node.get('children', [])))
             
-            # Save chat messages
-            for chat in chats_data:
-                if 'content' in chat and 'messages' in chat['content']:
-                    self.save_chat_messages(chat['id'], chat['content']['messages'])
+            # Chat nodes and their messages come from the chats file
+            def chat_nodes():
+                for chat in chats_data:
+                    if chat['type'] != 'chat':
+                        continue
+                    row = {
+                        'id': chat['id'],
+                        'name': chat['name'],
+                        'type': 'chat',
+                        'parent_id': chat.get('parentId'),
+                        'customization': chat.get('customization'),
+                    }
+                    if 'content' in chat and 'messages' in chat['content']:
+                        row['content'] = {'messages': chat['content']['messages']}
+                    yield row
             
-            return True
+            # Insert everything in one transaction instead of a commit per
+            # node and per content row
+            return self.import_nodes(chain(tree_nodes(), chat_nodes()))
             
         except Exception as e:
             logging.error(f"Error migrating data: {e}")
@@ -1025,6 +1638,12 @@ class DatabaseManager:
         """Move a node to a new parent and/or position."""
         try:
             with self.get_connection() as conn:
+                # Take the write lock before reading, so the positions read
+                # here can't change before the renumbering below, and the
+                # transaction never has to upgrade from a read lock (which
+                # fails with SQLITE_BUSY under a concurrent writer)
+                conn.execute("BEGIN IMMEDIATE")
+                
                 # Get current node info
                 cursor = conn.execute('SELECT parent_id, sort_order FROM nodes WHERE id = ?', (node_id,))
                 current_node = cursor.fetchone()
@@ -1038,43 +1657,44 @@ class DatabaseManager:
                 if new_sort_order is None:
                     cursor = conn.execute('''
                         SELECT COALESCE(MAX(sort_order), 0) + 1 as next_order
-                        FROM nodes WHERE parent_id = ? OR (parent_id IS NULL AND ? IS NULL)
-                    ''', (new_parent_id, new_parent_id))
+                        FROM nodes WHERE parent_id IS ?
+                    ''', (new_parent_id,))
                     new_sort_order = cursor.fetchone()['next_order']
                 
                 # Update the node's parent and sort order
                 conn.execute('''
-                    UPDATE nodes SET parent_id = ?, sort_order = ? WHERE id = ?
+                    UPDATE nodes SET parent_id = ?, sort_order = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
                 ''', (new_parent_id, new_sort_order, node_id))
                 
-                # Reorder siblings in the old parent (if parent changed)
+                # Renumber siblings with one set-based UPDATE each, ranking
+                # them in SQL instead of fetching IDs and updating row by row
+                
+                # Close the gap in the old parent (if parent changed)
                 if current_parent_id != new_parent_id:
-                    cursor = conn.execute('''
-                        SELECT id FROM nodes 
-                        WHERE (parent_id = ? OR (parent_id IS NULL AND ? IS NULL))
-                        AND sort_order > ?
-                        ORDER BY sort_order
-                    ''', (current_parent_id, current_parent_id, current_sort_order))
-                    
-                    for i, row in enumerate(cursor.fetchall()):
-                        conn.execute('''
-                            UPDATE nodes SET sort_order = ? WHERE id = ?
-                        ''', (current_sort_order + i, row['id']))
+                    conn.execute('''
+                        UPDATE nodes SET sort_order = ? + ranked.rn - 1, updated_at = CURRENT_TIMESTAMP
+                        FROM (
+                            SELECT id, ROW_NUMBER() OVER (ORDER BY sort_order) AS rn
+                            FROM nodes
+                            WHERE parent_id IS ?
+                            AND sort_order > ?
+                        ) AS ranked
+                        WHERE nodes.id = ranked.id
+                    ''', (current_sort_order, current_parent_id, current_sort_order))
                 
-                # Reorder siblings in the new parent (if inserting in the middle)
+                # Shift siblings after the insertion point in the new parent
                 if new_parent_id != current_parent_id or new_sort_order != current_sort_order:
-                    cursor = conn.execute('''
-                        SELECT id FROM nodes 
-                        WHERE (parent_id = ? OR (parent_id IS NULL AND ? IS NULL))
-                        AND id != ?
-                        AND sort_order >= ?
-                        ORDER BY sort_order
-                    ''', (new_parent_id, new_parent_id, node_id, new_sort_order))
-                    
-                    for i, row in enumerate(cursor.fetchall()):
-                        conn.execute('''
-                            UPDATE nodes SET sort_order = ? WHERE id = ?
-                        ''', (new_sort_order + i + 1, row['id']))
+                    conn.execute('''
+                        UPDATE nodes SET sort_order = ? + ranked.rn, updated_at = CURRENT_TIMESTAMP
+                        FROM (
+                            SELECT id, ROW_NUMBER() OVER (ORDER BY sort_order) AS rn
+                            FROM nodes
+                            WHERE parent_id IS ?
+                            AND id != ?
+                            AND sort_order >= ?
+                        ) AS ranked
+                        WHERE nodes.id = ranked.id
+                    ''', (new_sort_order, new_parent_id, node_id, new_sort_order))
                 
                 conn.commit()
                 return True
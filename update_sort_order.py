@@ -48,14 +48,16 @@ def update_sort_order():
                 parent_groups[parent_id] = []
             parent_groups[parent_id].append(node)
         
-        # Update sort_order for each group
-        for parent_id, children in parent_groups.items():
-            for i, node in enumerate(children):
-                conn.execute('''
-                    UPDATE nodes SET sort_order = ? WHERE id = ?
-                ''', (i, node['id']))
-        
-        conn.commit()
+        # Update sort_order for each group in one batched statement; the
+        # connection context manager commits once (or rolls back on error)
+        with conn:
+            conn.executemany('''
+                UPDATE nodes SET sort_order = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+            ''', [
+                (i, node['id'])
+                for children in parent_groups.values()
+                for i, node in enumerate(children)
+            ])
         print(f"Updated sort_order for {len(nodes)} nodes")
         
     except sqlite3.Error as e: